@@ -40,9 +40,21 @@ from database.models.exam_question import ExamQuestion
 from database.models.default_question_info import DefaultQuestionInfo
 from database.models.answer_option_info import AnswerOptionInfo
 from database.models.subject_detail import SubjectDetail
+from database.models.question_facet import QuestionFacet
+from database.models.conversation_thread import ConversationThread
+from database.models.model_call import ModelCall
+
+from database.models.user_question import partition_name_pattern
 
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names):
+    # Monthly user_questions partitions are managed by hand, not by autogenerate
+    if type_ == "table":
+        return partition_name_pattern.match(name) is None
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -86,6 +98,7 @@ def run_migrations_online() -> None:
             target_metadata=target_metadata,
             compare_type=True,  # Detect column type changes
             compare_server_default=True,  # Detect server default changes
+            include_name=include_name,
             # Additional configuration options as needed
         )
 
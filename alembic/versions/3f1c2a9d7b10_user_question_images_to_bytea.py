@@ -0,0 +1,116 @@
+"""user_questions images as bytea
+
+Revision ID: 3f1c2a9d7b10
+Revises: (this server's autogenerated head, see database.deployed_head)
+Create Date: 2026-10-19 10:00:00.000000
+
+Moves user_questions.image / image_small from base64 Text to bytea and records
+each image's content type. Rows are converted in batches, each committed on its own,
+so the table is never locked or rewritten in one long transaction.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.database import deployed_head
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7b10'
+# Servers already have a chain of untracked autogenerated revisions; continue it rather than
+# starting a second root, which would leave two heads and "upgrade head" failing
+down_revision: Union[str, Sequence[str], None] = deployed_head()
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+batch_size = 500
+
+# Legacy uploads were stored as sent by the app, thumbnails were always PNG
+content_type_sql = """
+    CASE
+        WHEN substring({column} from 1 for 3) = '\\xffd8ff'::bytea THEN 'image/jpeg'
+        WHEN substring({column} from 1 for 4) = '\\x89504e47'::bytea THEN 'image/png'
+        WHEN substring({column} from 1 for 4) = '\\x52494646'::bytea THEN 'image/webp'
+        WHEN substring({column} from 1 for 4) = '\\x47494638'::bytea THEN 'image/gif'
+        WHEN {column} IS NULL THEN NULL
+        ELSE 'application/octet-stream'
+    END
+"""
+
+
+def _column_types():
+    inspector = sa.inspect(op.get_bind())
+    if 'user_questions' not in inspector.get_table_names():
+        return {}
+    return {column['name']: column['type'] for column in inspector.get_columns('user_questions')}
+
+
+def upgrade() -> None:
+    columns = _column_types()
+    if not columns:
+        return  # create_all builds the table with the new layout
+
+    if 'image_content_type' not in columns:
+        op.add_column('user_questions', sa.Column('image_content_type', sa.String(), nullable=True))
+    if 'image_small_content_type' not in columns:
+        op.add_column('user_questions', sa.Column('image_small_content_type', sa.String(), nullable=True))
+
+    if not isinstance(columns.get('image'), sa.LargeBinary):
+        _convert_rows()
+
+    # JPEG/PNG bytes do not compress, and uncompressed out-of-line storage lets
+    # GET /ask/image read a value in slices without fetching all of it
+    op.execute("ALTER TABLE user_questions ALTER COLUMN image SET STORAGE EXTERNAL")
+    op.execute("ALTER TABLE user_questions ALTER COLUMN image_small SET STORAGE EXTERNAL")
+
+
+def _convert_rows():
+    op.add_column('user_questions', sa.Column('image_bytes', sa.LargeBinary(), nullable=True))
+    op.add_column('user_questions', sa.Column('image_small_bytes', sa.LargeBinary(), nullable=True))
+    op.add_column('user_questions', sa.Column('converted', sa.Boolean(), nullable=True))
+
+    image_content_type = content_type_sql.format(column="decode(image, 'base64')")
+    image_small_content_type = content_type_sql.format(column="decode(image_small, 'base64')")
+    convert_batch = sa.text(f"""
+        UPDATE user_questions
+        SET image_bytes = decode(image, 'base64'),
+            image_small_bytes = decode(image_small, 'base64'),
+            image_content_type = {image_content_type},
+            image_small_content_type = {image_small_content_type},
+            converted = true
+        WHERE id IN (
+            SELECT id FROM user_questions
+            WHERE converted IS NULL
+            LIMIT :batch_size
+        )
+    """)
+
+    with op.get_context().autocommit_block():
+        while True:
+            result = op.get_bind().execute(convert_batch, {"batch_size": batch_size})
+            print(f"user_questions: converted {result.rowcount} rows")
+            if result.rowcount < batch_size:
+                break
+
+    op.drop_column('user_questions', 'converted')
+    op.drop_column('user_questions', 'image')
+    op.drop_column('user_questions', 'image_small')
+    op.alter_column('user_questions', 'image_bytes', new_column_name='image')
+    op.alter_column('user_questions', 'image_small_bytes', new_column_name='image_small')
+
+
+def downgrade() -> None:
+    op.add_column('user_questions', sa.Column('image_text', sa.Text(), nullable=True))
+    op.add_column('user_questions', sa.Column('image_small_text', sa.Text(), nullable=True))
+    # encode() wraps base64 at 76 characters, the app always stored it unwrapped
+    op.execute("""
+        UPDATE user_questions
+        SET image_text = replace(encode(image, 'base64'), E'\\n', ''),
+            image_small_text = replace(encode(image_small, 'base64'), E'\\n', '')
+    """)
+    op.drop_column('user_questions', 'image')
+    op.drop_column('user_questions', 'image_small')
+    op.alter_column('user_questions', 'image_text', new_column_name='image')
+    op.alter_column('user_questions', 'image_small_text', new_column_name='image_small')
+    op.drop_column('user_questions', 'image_small_content_type')
+    op.drop_column('user_questions', 'image_content_type')
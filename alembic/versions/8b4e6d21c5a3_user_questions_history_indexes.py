@@ -0,0 +1,51 @@
+"""user_questions history indexes
+
+Revision ID: 8b4e6d21c5a3
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-19 11:00:00.000000
+
+Keyset pagination indexes for GET /ask/history, built CONCURRENTLY so writes to
+user_questions are not blocked while they build.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4e6d21c5a3'
+down_revision: Union[str, None] = '3f1c2a9d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    partitioned = op.get_bind().execute(sa.text("""
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('user_questions')
+    """)).scalar() is not None
+    if partitioned:
+        return  # created with the partitioned table, and CONCURRENTLY is not available there
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_questions_user_subject_created_at',
+            'user_questions',
+            ['user_id', 'subject', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_user_questions_user_created_at',
+            'user_questions',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_questions_user_created_at', 'user_questions',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_user_questions_user_subject_created_at', 'user_questions',
+                      postgresql_concurrently=True, if_exists=True)
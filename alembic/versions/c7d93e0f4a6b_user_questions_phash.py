@@ -0,0 +1,26 @@
+"""user_questions phash
+
+Revision ID: c7d93e0f4a6b
+Revises: 8b4e6d21c5a3
+Create Date: 2026-10-19 12:00:00.000000
+
+Perceptual hash of each answered upload, used by the answer cache. Existing rows are
+hashed in the background after startup (answer_cache.backfill_phash).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d93e0f4a6b'
+down_revision: Union[str, None] = '8b4e6d21c5a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE user_questions ADD COLUMN IF NOT EXISTS phash BIGINT")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE user_questions DROP COLUMN IF EXISTS phash")
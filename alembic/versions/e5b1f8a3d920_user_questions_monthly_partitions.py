@@ -0,0 +1,117 @@
+"""user_questions monthly partitions
+
+Revision ID: e5b1f8a3d920
+Revises: c7d93e0f4a6b
+Create Date: 2026-10-19 15:00:00.000000
+
+Turns user_questions into a table range-partitioned by created_at month. The existing
+table is not copied: it is renamed to user_questions_legacy and attached as the partition
+for everything before next month. The slow steps run first, without blocking writes:
+- a unique (id, created_at) index is built CONCURRENTLY, later promoted to the primary key
+- a CHECK constraint matching the partition bound is added NOT VALID, then validated
+Then the rename, the new parent and the ATTACH are pure catalog changes, done under a
+brief lock in one transaction, and ATTACH reuses the existing indexes instead of building new ones.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.models.user_question import legacy_partition, month_start, create_month_partitions
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1f8a3d920'
+down_revision: Union[str, None] = 'c7d93e0f4a6b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+months_ahead = 3
+
+history_indexes = {
+    'ix_user_questions_user_subject_created_at': '(user_id, subject, created_at DESC, id DESC)',
+    'ix_user_questions_user_created_at': '(user_id, created_at DESC, id DESC)',
+}
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text("""
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('user_questions')
+    """)).scalar() is not None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT to_regclass('user_questions')")).scalar() is None:
+        return  # create_all builds the partitioned table
+
+    if _is_partitioned(bind):
+        create_month_partitions(bind, month_start(date.today()), months_ahead + 1)
+        return
+
+    # The current month stays in the legacy partition, so rows written during the migration fit it
+    boundary = month_start(date.today(), 1).isoformat()
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS user_questions_legacy_id_created_at "
+            "ON user_questions (id, created_at)"
+        )
+        op.execute("ALTER TABLE user_questions DROP CONSTRAINT IF EXISTS user_questions_legacy_range")
+        op.execute(
+            f"ALTER TABLE user_questions ADD CONSTRAINT user_questions_legacy_range "
+            f"CHECK (created_at IS NOT NULL AND created_at < '{boundary}') NOT VALID"
+        )
+        op.execute("ALTER TABLE user_questions VALIDATE CONSTRAINT user_questions_legacy_range")
+
+    op.execute(f"ALTER TABLE user_questions RENAME TO {legacy_partition}")
+    # ATTACH only pairs the parent's primary key with a primary key of the same columns
+    op.execute(f"ALTER TABLE {legacy_partition} DROP CONSTRAINT user_questions_pkey")
+    op.execute(
+        f"ALTER TABLE {legacy_partition} ADD CONSTRAINT {legacy_partition}_pkey "
+        f"PRIMARY KEY USING INDEX user_questions_legacy_id_created_at"
+    )
+    for name in history_indexes:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name.replace('user_questions', legacy_partition)}")
+
+    op.execute(f"""
+        CREATE TABLE user_questions (LIKE {legacy_partition} INCLUDING DEFAULTS INCLUDING STORAGE)
+        PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER TABLE user_questions ADD CONSTRAINT user_questions_pkey PRIMARY KEY (id, created_at)")
+    for name, columns in history_indexes.items():
+        op.execute(f"CREATE INDEX {name} ON user_questions {columns}")
+
+    op.execute(
+        f"ALTER TABLE user_questions ATTACH PARTITION {legacy_partition} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{boundary}')"
+    )
+    create_month_partitions(bind, month_start(date.today(), 1), months_ahead)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if not _is_partitioned(bind):
+        return
+
+    attached = bind.execute(sa.text("""
+        SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name)
+    """), {"name": legacy_partition}).scalar() is not None
+    if attached:
+        op.execute(f"ALTER TABLE user_questions DETACH PARTITION {legacy_partition}")
+        op.execute(f"ALTER TABLE {legacy_partition} DROP CONSTRAINT IF EXISTS user_questions_legacy_range")
+    else:
+        op.execute(f"CREATE TABLE {legacy_partition} (LIKE user_questions INCLUDING DEFAULTS INCLUDING STORAGE)")
+        op.execute(f"ALTER TABLE {legacy_partition} ADD CONSTRAINT {legacy_partition}_pkey PRIMARY KEY (id)")
+        for name, columns in history_indexes.items():
+            op.execute(f"CREATE INDEX {name.replace('user_questions', legacy_partition)} ON {legacy_partition} {columns}")
+
+    # Rows written since the upgrade are in the monthly partitions
+    op.execute(f"INSERT INTO {legacy_partition} SELECT * FROM user_questions")
+    op.execute("DROP TABLE user_questions")
+
+    op.execute(f"ALTER TABLE {legacy_partition} RENAME TO user_questions")
+    op.execute(f"ALTER TABLE user_questions DROP CONSTRAINT {legacy_partition}_pkey")
+    op.execute("ALTER TABLE user_questions ADD CONSTRAINT user_questions_pkey PRIMARY KEY (id)")
+    for name in history_indexes:
+        op.execute(f"ALTER INDEX IF EXISTS {name.replace('user_questions', legacy_partition)} RENAME TO {name}")
@@ -0,0 +1,28 @@
+"""user_questions thumbnail md5
+
+Revision ID: f2a7c4e81b36
+Revises: e5b1f8a3d920
+Create Date: 2026-10-20 10:00:00.000000
+
+md5 of image_small, written with the row and used as the thumbnail ETag, so a 304
+revalidation does not read the image. Existing rows are not backfilled: the thumbnail
+endpoint falls back to md5(image_small) while the column is NULL.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c4e81b36'
+down_revision: Union[str, None] = 'e5b1f8a3d920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A NULL column without a default is a catalog-only change, also on the partitions
+    op.execute("ALTER TABLE user_questions ADD COLUMN IF NOT EXISTS image_small_md5 VARCHAR")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE user_questions DROP COLUMN IF EXISTS image_small_md5")
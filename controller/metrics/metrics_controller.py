@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+
+from service.metrics import snapshot
+
+metrics = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@metrics.get("")
+async def get_metrics():
+    return snapshot()
@@ -1,7 +1,6 @@
 import json
 from io import BytesIO
 from typing import Optional, List
-from fastapi.encoders import jsonable_encoder
 from uuid import uuid4
 from PIL import Image
 from fastapi import APIRouter, Form, Depends, HTTPException
@@ -10,12 +9,14 @@ from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, StreamingResponse
 
 from database.database import get_db
-from database.pydantic_models.pydantic_models import ExamQuestionCreate, QuestionRequest
+from database.pydantic_models.pydantic_models import ExamQuestionCreate, QuestionRequest, VariantExportRequest
+from service.responses import FastJSONResponse
 from service.question_bank.question_bank_service import save_exam_question, save_subject_details, \
-    get_subject_details_data, delete_question, export_question_service
+    get_subject_details_data, delete_question, export_question_service, get_question_facets, \
+    export_variants_service
 
 question_bank = APIRouter(
     prefix="/question-bank",
@@ -97,13 +98,20 @@ async def get_subject_details(
         subject: str,
         db: Session = Depends(get_db)
 ):
-    return JSONResponse(
-        jsonable_encoder(
-            await get_subject_details_data(subject, db)),
-        media_type="application/json; charset=utf-8"
+    return FastJSONResponse(
+        await get_subject_details_data(subject, db)
     )
 
 
+@question_bank.get("/facets")
+async def get_facets(
+        subject: str = "",
+        exam: str = "",
+        db: Session = Depends(get_db)
+):
+    return await get_question_facets(subject, exam, db)
+
+
 @question_bank.delete("/{question_id}")
 async def delete_question_by_id(
         question_id: str,
@@ -120,6 +128,8 @@ async def export_question(
         years: str,
         months: str,
         grades: str,
+        counts: Optional[str] = None,
+        seed: Optional[int] = None,
         db: Session = Depends(get_db)
 ):
 
@@ -128,8 +138,21 @@ async def export_question(
     months = [int(i) for i in months.split(',')] if len(months) > 0 else []
     grades = grades.split(',')
 
+    # Sampling mode: counts=빈칸 추론:20,글의 순서:10 draws that many random questions per type
+    type_counts = None
+    if counts:
+        try:
+            type_counts = {
+                question_type.strip(): int(count)
+                for question_type, count in (i.rsplit(':', 1) for i in counts.split(','))
+            }
+        except ValueError:
+            raise HTTPException(status_code=400, detail="counts must look like '빈칸 추론:20,글의 순서:10'")
+        if any(count < 0 for count in type_counts.values()):
+            raise HTTPException(status_code=400, detail="counts must not be negative")
+
     file_path = await export_question_service(
-            subject, exam, selections, years, months, grades, db
+            subject, exam, selections, years, months, grades, db, type_counts, seed
         )
 
     return FileResponse(
@@ -137,3 +160,21 @@ async def export_question(
         media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         filename="output.docx",
     )
+
+
+@question_bank.post("/export/variants")
+async def export_question_variants(
+        variant_request: VariantExportRequest,
+        db: Session = Depends(get_db)
+):
+    zip_stream, seed = await export_variants_service(variant_request, db)
+
+    # Sending the seed back as "seed" reproduces this export
+    return StreamingResponse(
+        zip_stream,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="variants_{seed}.zip"',
+            "X-Variant-Seed": str(seed),
+        },
+    )
@@ -1,11 +1,16 @@
+import asyncio
+from typing import List
+
 from fastapi import APIRouter
-from fastapi import FastAPI, File, UploadFile, Request
+from fastapi import FastAPI, File, UploadFile, Request, Header
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from database.database import engine
 from service.auth.auth_service import login
-from service.questions.questions_service import get_questions, answer_question
+from service.questions.questions_service import get_questions, answer_question, answer_question_stream, \
+    get_question_image, get_question_thumbnail, answer_batch, answer_followup
+from database.pydantic_models.pydantic_models import FollowupRequest
 
 question = APIRouter(
     prefix="/ask",
@@ -13,14 +18,48 @@ question = APIRouter(
 )
 
 
+# Registered before "/{subject}/{user_id}", which would otherwise match /followup/{question_id}
+@question.post("/followup/{question_id}")
+async def create_followup(
+        question_id: str,
+        followup: FollowupRequest,
+):
+    return await answer_followup(question_id, followup)
+
+
 @question.post("/{subject}/{user_id}")
 async def create_upload_file(
         req: Request,
         file: UploadFile = File(...),
         subject: str = 'math',
         user_id: str = "unknown",
+        use_cache: bool = True,
+        idempotency_key: str = Header(None),
+):
+    return await answer_question(req, file, subject, user_id, use_cache, idempotency_key)
+
+
+@question.post("/{subject}/{user_id}/stream")
+async def create_upload_file_stream(
+        req: Request,
+        file: UploadFile = File(...),
+        subject: str = 'math',
+        user_id: str = "unknown",
+        use_cache: bool = True,
+        idempotency_key: str = Header(None),
 ):
-    return await answer_question(req, file, subject, user_id)
+    return await answer_question_stream(req, file, subject, user_id, use_cache, idempotency_key)
+
+
+@question.post("/{subject}/{user_id}/batch")
+async def create_upload_files_batch(
+        req: Request,
+        files: List[UploadFile] = File(...),
+        subject: str = 'math',
+        user_id: str = "unknown",
+        use_cache: bool = True,
+):
+    return await answer_batch(req, files, subject, user_id, use_cache)
 
 
 @question.get("/history/{subject}/{device_id}")
@@ -29,5 +68,23 @@ async def get_questions_list(
         device_id: str = "unknown",
         start: str = None,
         end: str = None,
+        limit: int = 30,
+        before: str = None,
+):
+    return await get_questions(device_id, subject, start, end, limit, before)
+
+
+@question.get("/image/{question_id}")
+async def get_image(
+        question_id: str,
+        size: str = "original",
+):
+    return await asyncio.to_thread(get_question_image, question_id, size)
+
+
+@question.get("/thumbnail/{question_id}")
+async def get_thumbnail(
+        question_id: str,
+        if_none_match: str = Header(None),
 ):
-    return await get_questions(device_id, subject, start, end)
+    return await asyncio.to_thread(get_question_thumbnail, question_id, if_none_match)
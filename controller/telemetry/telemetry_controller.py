@@ -0,0 +1,31 @@
+import asyncio
+
+from fastapi import APIRouter
+
+from service.questions.model_telemetry import get_model_call_stats
+from service.responses import FastJSONResponse
+
+telemetry = APIRouter(
+    prefix="/telemetry",
+    tags=["telemetry"],
+)
+
+
+@telemetry.get("/model-calls/daily")
+async def get_daily_model_calls(days: int = 30):
+    return FastJSONResponse(await asyncio.to_thread(get_model_call_stats, "day", days))
+
+
+@telemetry.get("/model-calls/subjects")
+async def get_model_calls_by_subject(days: int = 30):
+    return FastJSONResponse(await asyncio.to_thread(get_model_call_stats, "subject", days))
+
+
+@telemetry.get("/model-calls/users")
+async def get_model_calls_by_user(days: int = 30, limit: int = 50):
+    return FastJSONResponse(await asyncio.to_thread(get_model_call_stats, "user", days, limit))
+
+
+@telemetry.get("/model-calls/tiers")
+async def get_model_calls_by_tier(days: int = 30):
+    return FastJSONResponse(await asyncio.to_thread(get_model_call_stats, "tier", days))
@@ -1,7 +1,9 @@
 # 필요한 라이브러리 import하기
+import ast
 import subprocess
 import os
 from contextlib import contextmanager
+from typing import Dict, Optional, Tuple, Union
 
 from dotenv import load_dotenv
 
@@ -89,6 +91,117 @@ def check_model_changes():
     return False  # No differences found
 
 
+versions_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic", "versions")
+
+# The first hand-written revision kept in git. Everything before it on a server was written
+# there by `alembic revision --autogenerate` and is not in git, so its ids differ per server.
+first_tracked_revision = '3f1c2a9d7b10'
+
+
+def _revision_links(path: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    # revision and down_revision of a revision file, read without importing it
+    values = {}
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        target = node.target if isinstance(node, ast.AnnAssign) else (
+            node.targets[0] if isinstance(node, ast.Assign) and len(node.targets) == 1 else None)
+        if isinstance(target, ast.Name) and target.id in ("revision", "down_revision") and node.value is not None:
+            try:
+                values[target.id] = ast.literal_eval(node.value)
+            except ValueError:
+                values[target.id] = None  # computed, like the first tracked revision's
+    if not isinstance(values.get("revision"), str):
+        return None
+    down = values.get("down_revision")
+    if down is None:
+        down = ()
+    elif isinstance(down, str):
+        down = (down,)
+    return values["revision"], tuple(down)
+
+
+def revision_links() -> Dict[str, Tuple[str, ...]]:
+    """
+    revision -> down_revisions of every file in alembic/versions.
+    """
+    links: Dict[str, Tuple[str, ...]] = {}
+    for name in os.listdir(versions_dir):
+        if name.endswith(".py"):
+            parsed = _revision_links(os.path.join(versions_dir, name))
+            if parsed is not None:
+                links[parsed[0]] = parsed[1]
+    return links
+
+
+def deployed_head() -> Union[str, Tuple[str, ...], None]:
+    """
+    Head of the revisions this server autogenerated before the tracked ones existed, so the
+    first tracked revision continues that chain instead of starting a second root.
+    None on a fresh checkout without such files.
+    """
+    links = revision_links()
+
+    # Revisions autogenerated after the tracked ones descend from them and are not part of the old chain
+    tracked = {first_tracked_revision}
+    changed = True
+    while changed:
+        changed = False
+        for revision, down in links.items():
+            if revision not in tracked and tracked.intersection(down):
+                tracked.add(revision)
+                changed = True
+
+    deployed = set(links) - tracked
+    parents = {parent for revision in deployed for parent in links[revision]}
+    heads = sorted(deployed - parents)
+    if not heads:
+        return None
+    return heads[0] if len(heads) == 1 else tuple(heads)
+
+
+def check_revisions_present():
+    """
+    Fails startup when alembic_version points at a revision whose file is not in
+    alembic/versions (e.g. the server's untracked autogenerated files were lost):
+    upgrading from there would either fail or run the tracked revisions on the wrong base.
+    """
+    try:
+        with engine.connect() as connection:
+            versions = connection.execute(text("SELECT version_num FROM alembic_version")).scalars().all()
+    except Exception:
+        return  # no alembic_version yet, upgrade starts from the base
+
+    known = revision_links()
+    missing = [version for version in versions if version not in known]
+    if missing:
+        raise RuntimeError(
+            f"alembic_version is at {', '.join(missing)}, which is not in {versions_dir}. "
+            f"Restore that revision file from the server's previous checkout before starting."
+        )
+
+
+def apply_pending_revisions():
+    """
+    Runs the hand-written revisions in alembic/versions (data conversions, indexes) on every
+    startup, before anything is autogenerated against the schema. A failure stops startup:
+    the models would otherwise write to columns that were never converted.
+    """
+    check_revisions_present()
+    try:
+        result = subprocess.run(
+            ["alembic", "upgrade", "head"],
+            check=True,
+            capture_output=True,  # Capture output
+            text=True  # Output as text
+        )
+        print(result.stdout)
+    except subprocess.CalledProcessError as e:
+        print(f"Error applying pending revisions: {e}")
+        print(e.stderr)
+        raise
+
+
 def run_alembic_migration():
     """
     Runs alembic revision and upgrade if a schema change is detected.
@@ -96,20 +209,8 @@ def run_alembic_migration():
     if check_model_changes():
         try:
             print("Generating migration script...")
-            # Generate alembic migration script
-
-            subprocess.run(
-                ["alembic", "stamp", "head"],
-                check=True,
-                capture_output=True,  # Capture output
-                text=True  # Output as text
-            )
-            subprocess.run(
-                ["alembic", "upgrade", "head"],
-                check=True,
-                capture_output=True,  # Capture output
-                text=True  # Output as text
-            )
+            # Generate alembic migration script. apply_pending_revisions has already upgraded to head;
+            # stamping head here would mark revisions as applied without running them.
             result = subprocess.run(
                 ["alembic", "revision", "--autogenerate", "-m", "Auto migration"],
                 check=True,
@@ -134,6 +235,7 @@ def run_alembic_migration():
         except subprocess.CalledProcessError as e:
             print(f"Error during migration: {e}")
             print(e.stderr)  # Print the stderr from the command
+            raise
     else:
         print("No model changes detected. Skipping migration.")
 
@@ -9,6 +9,7 @@ from sqlalchemy.orm import relationship
 from sqlmodel import SQLModel, Field
 
 from database.database import Base
+from database.read_models.read_models import AnswerOptionInfoDTO
 from pydantic import BaseModel
 
 
@@ -33,19 +34,5 @@ class AnswerOptionInfo(Base):
     # Relationship back to ExamQuestion
     exam_question = relationship('ExamQuestion', back_populates='answer_option_info_list')
 
-    def to_json(self):
-        return {
-            "id": self.id,
-            "exam_question_id": self.exam_question_id,
-            "question_number": self.question_number,
-            "question_score": self.question_score,
-            "abc_option_list": self.abc_option_list,
-            "question_text": self.question_text,
-            "option1": self.option1,
-            "option2": self.option2,
-            "option3": self.option3,
-            "option4": self.option4,
-            "option5": self.option5,
-            "answer": self.answer,
-            "memo": self.memo,
-        }
\ No newline at end of file
+    def to_json(self) -> AnswerOptionInfoDTO:
+        return AnswerOptionInfoDTO.from_orm(self)
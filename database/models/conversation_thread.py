@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+
+from database.database import Base
+
+
+@dataclass
+class ConversationThread(Base):
+    """
+    One /test/ask conversation per user: [{"role", "content", "tokens"}, ...], oldest first.
+    """
+    __tablename__ = 'conversation_threads'
+
+    user_id: str = Column(String, primary_key=True)
+    messages: list = Column(JSONB, nullable=False, default=list)
+    updated_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,4 +1,5 @@
 from sqlalchemy import Select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, SQLModel
 
@@ -17,6 +18,25 @@ async def create(item):
         print(f"Failed to add item due to integrity constraint. (id: {item.id})")
 
 
+def insert_many(items):
+    """
+    Inserts items of one model in a single multi-row INSERT, skipping ids that already exist.
+    Blocking, and database errors are left to the caller. Columns that are None in every
+    item are left out, so serial ids and column defaults are filled in as usual.
+    """
+    if not items:
+        return
+    table = items[0].__class__.__table__
+    columns = [
+        column for column in table.columns
+        if any(getattr(item, column.key) is not None for item in items)
+    ]
+    rows = [{column.key: getattr(item, column.key) for column in columns} for item in items]
+    with Session(engine) as session:
+        session.execute(insert(table).values(rows).on_conflict_do_nothing())
+        session.commit()
+
+
 def get(item):
     try:
         with Session(engine) as session:
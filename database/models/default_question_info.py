@@ -9,6 +9,7 @@ from sqlalchemy.orm import relationship
 from sqlmodel import SQLModel, Field
 
 from database.database import Base
+from database.read_models.read_models import DefaultQuestionInfoDTO
 from pydantic import BaseModel
 
 
@@ -25,13 +26,5 @@ class DefaultQuestionInfo(Base):
 
     exam_question = relationship('ExamQuestion', back_populates='default_question_info', uselist=False)
 
-    def to_json(self):
-        return {
-            "id": self.id,
-            "exam": self.exam,
-            "exam_year": self.exam_year,
-            "exam_month": self.exam_month,
-            "grade": self.grade,
-            "file_path": self.file_path,
-            "selected_file_bytes": str(self.selected_file_bytes) if self.selected_file_bytes else None,
-        }
+    def to_json(self) -> DefaultQuestionInfoDTO:
+        return DefaultQuestionInfoDTO.from_orm(self)
@@ -9,6 +9,7 @@ from sqlalchemy.orm import relationship
 from sqlmodel import SQLModel, Field
 
 from database.database import Base
+from database.read_models.read_models import ExamQuestionDTO
 from pydantic import BaseModel
 
 
@@ -23,6 +24,7 @@ class ExamQuestion(Base):
 
     question_content_text_map = Column(JSONB, default=dict)
     question_numbers = Column(String, nullable=False)  # Add this field
+    layout_metrics = Column(JSONB(none_as_null=True), nullable=True)  # Estimated rendered size, see layout_metrics.py
 
     default_question_info_id = Column(Integer, ForeignKey('default_question_infos.id'))
     default_question_info = relationship('DefaultQuestionInfo', back_populates='exam_question')
@@ -33,14 +35,6 @@ class ExamQuestion(Base):
         cascade='all, delete-orphan'
     )
 
-    def to_json(self):
-        return {
-            "id": self.id,
-            "subject": self.subject,
-            "type": self.type,
-            "valid": self.valid,
-            "question_content_text_map": self.question_content_text_map,
-            "question_numbers": self.question_numbers,
-            "default_question_info": self.default_question_info.to_json() if self.default_question_info else None,
-            "answer_option_info_list": [info.to_json() for info in self.answer_option_info_list],
-        }
+    def to_json(self) -> ExamQuestionDTO:
+        # A slot dataclass: FastJSONResponse (orjson) serializes it as is, no dict is built
+        return ExamQuestionDTO.from_orm(self)
@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index
+
+from database.database import Base
+
+
+@dataclass
+class ModelCall(Base):
+    """
+    One row per outbound model call, append-only. Times are in milliseconds; ttft_ms is only
+    set for streamed calls and latency_ms is null when the call never got a slot.
+    """
+    __tablename__ = 'model_calls'
+
+    id: int = Column(BigInteger, primary_key=True, autoincrement=True)
+    created_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False)
+    user_id: str = Column(String, nullable=True)
+    subject: str = Column(String, nullable=True)
+    tier: str = Column(String, nullable=False)  # triage, solve, followup or test
+    model: str = Column(String, nullable=False)
+    outcome: str = Column(String, nullable=False)  # clear, unclear, answered, error, busy, timeout or cancelled
+    queue_wait_ms: int = Column(Integer, nullable=True)
+    ttft_ms: int = Column(Integer, nullable=True)
+    latency_ms: int = Column(Integer, nullable=True)
+    prompt_tokens: int = Column(Integer, nullable=True)
+    completion_tokens: int = Column(Integer, nullable=True)
+    image_tokens: int = Column(Integer, nullable=True)
+
+
+# Rows arrive in time order, so a BRIN index covers the date-range aggregates at a tiny size
+Index('ix_model_calls_created_at', ModelCall.created_at, postgresql_using='brin')
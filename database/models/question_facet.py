@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+
+from database.database import Base
+
+
+@dataclass
+class QuestionFacet(Base):
+    """
+    Rollup of valid exam questions per subject × exam × year × month × grade × type.
+    Maintained in the same transaction as every write to exam_questions.
+    """
+    __tablename__ = 'question_facets'
+    __table_args__ = (
+        UniqueConstraint(
+            'subject', 'exam', 'exam_year', 'exam_month', 'grade', 'type',
+            name='uq_question_facets_key'
+        ),
+    )
+
+    id: int = Column(Integer, primary_key=True, autoincrement=True)
+    subject: str = Column(String, nullable=False)
+    exam: str = Column(String, nullable=False, default='')
+    exam_year: int = Column(Integer, nullable=False, default=0)
+    exam_month: int = Column(Integer, nullable=False, default=0)
+    grade: str = Column(String, nullable=False, default='')
+    type: str = Column(String, nullable=False, default='')
+    count: int = Column(Integer, nullable=False, default=0)
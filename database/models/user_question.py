@@ -1,8 +1,10 @@
 import base64
+import re
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, BINARY, VARBINARY, LargeBinary, DateTime, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, BINARY, VARBINARY, LargeBinary, DateTime, Text, \
+    Index, BigInteger, text
 from sqlalchemy.orm import relationship
 
 from sqlmodel import SQLModel, Field
@@ -12,11 +14,70 @@ from database.database import Base
 
 @dataclass
 class UserQuestion(Base):
+    """
+    Range-partitioned by created_at month (user_questions_pYYYY_MM), so history reads,
+    vacuum and image retention only touch the months they need. The partition key has
+    to be part of the primary key, hence (id, created_at).
+    """
     __tablename__ = 'user_questions'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
     id: str = Column(String, default=None, primary_key=True)
     user_id: str = Column(String, default=None, nullable=True)
     subject: str = Column(String, default=None, nullable=True)
     answer: str = Column(Text, default=None, nullable=True)
-    image: str = Column(Text, default=None, nullable=True)
-    image_small: str = Column(Text, default=None, nullable=True)
-    created_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False)
+    image: bytes = Column(LargeBinary, default=None, nullable=True)
+    image_small: bytes = Column(LargeBinary, default=None, nullable=True)
+    image_content_type: str = Column(String, default=None, nullable=True)
+    image_small_content_type: str = Column(String, default=None, nullable=True)
+    image_small_md5: str = Column(String, default=None, nullable=True)  # thumbnail ETag, hex md5 of image_small
+    phash: int = Column(BigInteger, default=None, nullable=True)  # perceptual hash of image_small
+    created_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False, primary_key=True)
+
+
+# History is read newest first per user, optionally per subject, with (created_at, id) keyset pagination
+Index(
+    'ix_user_questions_user_subject_created_at',
+    UserQuestion.user_id, UserQuestion.subject, UserQuestion.created_at.desc(), UserQuestion.id.desc(),
+)
+Index(
+    'ix_user_questions_user_created_at',
+    UserQuestion.user_id, UserQuestion.created_at.desc(), UserQuestion.id.desc(),
+)
+
+
+# Rows from before partitioning live in one partition covering everything up to the migration
+legacy_partition = 'user_questions_legacy'
+partition_name_pattern = re.compile(r'^user_questions_(legacy|p\d{4}_\d{2})$')
+
+
+def month_start(value, months: int = 0) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"user_questions_p{month.year:04d}_{month.month:02d}"
+
+
+def create_month_partitions(connection, first_month: date, months: int):
+    """
+    Creates the monthly partitions [first_month, first_month + months) that do not exist yet.
+    A partition with no rows is created instantly, so running this ahead of time is cheap.
+    """
+    created = []
+    for offset in range(months):
+        lower = month_start(first_month, offset)
+        upper = month_start(lower, 1)
+        name = partition_name(lower)
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+            continue
+        connection.execute(text(f"""
+            CREATE TABLE {name}
+            PARTITION OF user_questions
+            FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')
+        """))
+        # Same out-of-line, uncompressed image storage as the rest of the table
+        connection.execute(text(f"ALTER TABLE {name} ALTER COLUMN image SET STORAGE EXTERNAL"))
+        connection.execute(text(f"ALTER TABLE {name} ALTER COLUMN image_small SET STORAGE EXTERNAL"))
+        created.append(name)
+    return created
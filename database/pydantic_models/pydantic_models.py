@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Annotated
 
 from pydantic import BaseModel, Field
 
@@ -89,3 +89,25 @@ class ExamQuestionRead(ExamQuestionBase):
 
     class Config:
         orm_mode = True
+
+
+class VariantExportRequest(BaseModel):
+    subject: str = Field(..., alias='subject')
+    exam: str = Field('', alias='exam')
+    selections: List[str] = Field(default_factory=list, alias='selections')
+    years: List[int] = Field(default_factory=list, alias='years')
+    months: List[int] = Field(default_factory=list, alias='months')
+    grades: List[str] = Field(default_factory=list, alias='grades')
+    type_counts: Optional[Dict[str, Annotated[int, Field(ge=0)]]] = Field(None, alias='typeCounts')
+    question_ids: List[int] = Field(default_factory=list, alias='questionIds')
+    count: int = Field(1, ge=1, le=200, alias='count')
+    user_ids: List[str] = Field(default_factory=list, alias='userIds')
+    use_students: bool = Field(False, alias='useStudents')
+    seed: Optional[int] = Field(None, alias='seed')
+
+
+class FollowupRequest(BaseModel):
+    question: str = Field(..., min_length=1, alias='question')
+    line_number: Optional[int] = Field(None, ge=1, alias='lineNumber')
+    include_image: bool = Field(False, alias='includeImage')
+    stream: bool = Field(False, alias='stream')
@@ -0,0 +1,130 @@
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+def encode_binary(value: Optional[bytes]) -> Optional[str]:
+    """
+    Every binary column leaves the API as a base64 string (or null), never as a Python bytes repr.
+    """
+    if value is None:
+        return None
+    return base64.b64encode(value).decode('ascii')
+
+
+@dataclass(slots=True)
+class DefaultQuestionInfoDTO:
+    id: int
+    exam: str
+    exam_year: int
+    exam_month: int
+    grade: str
+    file_path: str
+    selected_file_bytes: Optional[str] = None
+
+    @classmethod
+    def from_orm(cls, info, include_binary: bool = True):
+        return cls(
+            id=info.id,
+            exam=info.exam,
+            exam_year=info.exam_year,
+            exam_month=info.exam_month,
+            grade=info.grade,
+            file_path=info.file_path,
+            selected_file_bytes=encode_binary(info.selected_file_bytes) if include_binary else None,
+        )
+
+
+@dataclass(slots=True)
+class AnswerOptionInfoDTO:
+    id: int
+    exam_question_id: int
+    question_number: int
+    question_score: int
+    abc_option_list: Optional[List[str]]
+    question_text: str
+    option1: str
+    option2: str
+    option3: str
+    option4: str
+    option5: str
+    answer: int
+    memo: str
+
+    @classmethod
+    def from_orm(cls, info):
+        return cls(
+            id=info.id,
+            exam_question_id=info.exam_question_id,
+            question_number=info.question_number,
+            question_score=info.question_score,
+            abc_option_list=info.abc_option_list,
+            question_text=info.question_text,
+            option1=info.option1,
+            option2=info.option2,
+            option3=info.option3,
+            option4=info.option4,
+            option5=info.option5,
+            answer=info.answer,
+            memo=info.memo,
+        )
+
+
+@dataclass(slots=True)
+class ExamQuestionDTO:
+    id: int
+    subject: str
+    type: str
+    valid: bool
+    question_content_text_map: Dict[str, Any]
+    question_numbers: str
+    default_question_info: Optional[DefaultQuestionInfoDTO]
+    answer_option_info_list: List[AnswerOptionInfoDTO] = field(default_factory=list)
+
+    @classmethod
+    def from_orm(cls, question, include_binary: bool = True):
+        default_question_info = question.default_question_info
+        return cls(
+            id=question.id,
+            subject=question.subject,
+            type=question.type,
+            valid=question.valid,
+            question_content_text_map=question.question_content_text_map,
+            question_numbers=question.question_numbers,
+            default_question_info=DefaultQuestionInfoDTO.from_orm(
+                default_question_info, include_binary
+            ) if default_question_info else None,
+            answer_option_info_list=[
+                AnswerOptionInfoDTO.from_orm(info) for info in question.answer_option_info_list
+            ],
+        )
+
+
+@dataclass(slots=True)
+class UserQuestionHistoryDTO:
+    id: str
+    subject: str
+    answer: str
+    thumbnail_url: Optional[str]
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class ModelCallStatsDTO:
+    key: str  # the day, subject or user the row is grouped by
+    model: str
+    calls: int
+    errors: int
+    unclear: int
+    busy: int
+    timeouts: int
+    avg_queue_wait_ms: Optional[float]
+    avg_ttft_ms: Optional[float]
+    avg_latency_ms: Optional[float]
+    p50_latency_ms: Optional[float]
+    p95_latency_ms: Optional[float]
+    prompt_tokens: int
+    completion_tokens: int
+    image_tokens: int
+    cost_usd: float
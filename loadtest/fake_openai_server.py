@@ -0,0 +1,177 @@
+"""
+Stand-in for the OpenAI chat-completions endpoint, for load-testing the /ask pipeline
+without spending API money.
+
+    uvicorn loadtest.fake_openai_server:app --port 9000 --workers 1
+    OPENAI_BASE_URL=http://localhost:9000/v1 uvicorn main:app --port 8000
+
+Behaviour is set with FAKE_* environment variables:
+
+    FAKE_LATENCY          fixed | uniform | exponential | lognormal   (time to first token)
+    FAKE_LATENCY_MS       mean latency in ms (default 1500)
+    FAKE_LATENCY_SIGMA    lognormal sigma (default 0.5)
+    FAKE_TAIL_RATE        share of calls that are stragglers (default 0)
+    FAKE_TAIL_MULTIPLIER  how many times slower a straggler is (default 10)
+    FAKE_ERROR_RATE       share of calls answered 500 (default 0)
+    FAKE_RATE_LIMIT_RATE  share of calls answered 429 with Retry-After (default 0)
+    FAKE_UNCLEAR_RATE     share of answers without the "1" clarity prefix, and of
+                          triage calls (logprobs=true) answered "0" (default 0)
+    FAKE_TOKENS_PER_SEC   streaming speed (default 50)
+    FAKE_ANSWER_TOKENS    tokens per answer (default 300)
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY = os.getenv("FAKE_LATENCY", "lognormal")
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "1500"))
+LATENCY_SIGMA = float(os.getenv("FAKE_LATENCY_SIGMA", "0.5"))
+TAIL_RATE = float(os.getenv("FAKE_TAIL_RATE", "0"))
+TAIL_MULTIPLIER = float(os.getenv("FAKE_TAIL_MULTIPLIER", "10"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+RATE_LIMIT_RATE = float(os.getenv("FAKE_RATE_LIMIT_RATE", "0"))
+UNCLEAR_RATE = float(os.getenv("FAKE_UNCLEAR_RATE", "0"))
+TOKENS_PER_SEC = float(os.getenv("FAKE_TOKENS_PER_SEC", "50"))
+ANSWER_TOKENS = int(os.getenv("FAKE_ANSWER_TOKENS", "300"))
+
+app = FastAPI()
+
+answer_words = ["풀이", "1)", "주어진", "식을", "정리하면", "[:x^2 + 2x + 1 = 0]", "이므로", "답은", "②", "입니다.", "\n"]
+
+
+def sample_latency() -> float:
+    # Stragglers model a slow upstream replica: the same request sent again is usually fast
+    return base_latency() * (TAIL_MULTIPLIER if random.random() < TAIL_RATE else 1)
+
+
+def base_latency() -> float:
+    mean = LATENCY_MS / 1000
+    if LATENCY == "fixed":
+        return mean
+    if LATENCY == "uniform":
+        return random.uniform(0, 2 * mean)
+    if LATENCY == "exponential":
+        return random.expovariate(1 / mean)
+    # lognormal with the requested mean
+    return random.lognormvariate(0, LATENCY_SIGMA) * mean / math.exp(LATENCY_SIGMA ** 2 / 2)
+
+
+def answer_tokens():
+    yield "1. " if random.random() >= UNCLEAR_RATE else "0. "
+    for i in range(ANSWER_TOKENS - 1):
+        yield answer_words[i % len(answer_words)] + " "
+
+
+def triage_logprobs(clear: bool) -> dict:
+    # Confident most of the time, with some calls landing near the threshold
+    p_one = random.uniform(0.6, 0.999) if clear else random.uniform(0.001, 0.4)
+    top = [
+        {"token": "1", "logprob": math.log(p_one), "bytes": None},
+        {"token": "0", "logprob": math.log(1 - p_one), "bytes": None},
+    ]
+    if not clear:
+        top.reverse()
+    return {"content": [dict(top[0], top_logprobs=top)]}
+
+
+def error_response(status: int, message: str, headers=None):
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": "fake_error", "code": status}},
+        headers=headers,
+    )
+
+
+def chunk(completion_id: str, model: str, created: int, delta: dict, finish_reason=None) -> str:
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }, ensure_ascii=False) + "\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    stream = body.get("stream", False)
+    max_tokens = body.get("max_tokens") or ANSWER_TOKENS
+    app.state.calls = getattr(app.state, "calls", 0) + 1
+
+    roll = random.random()
+    if roll < RATE_LIMIT_RATE:
+        return error_response(429, "Rate limit reached (fake)", {"retry-after": "1"})
+    if roll < RATE_LIMIT_RATE + ERROR_RATE:
+        return error_response(500, "Internal server error (fake)")
+
+    await asyncio.sleep(sample_latency())
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    tokens = list(answer_tokens())[:max_tokens]
+    prompt_tokens = 1200
+    logprobs = None
+    if body.get("logprobs"):
+        # Triage call: a single "1"/"0" token with its alternatives
+        clear = random.random() >= UNCLEAR_RATE
+        logprobs = triage_logprobs(clear)
+        tokens = [logprobs["content"][0]["token"]]
+        prompt_tokens = 300
+
+    if not stream:
+        # The non-streaming call returns after the whole completion would have been generated
+        await asyncio.sleep(len(tokens) / TOKENS_PER_SEC)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "logprobs": logprobs,
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        }
+
+    async def events():
+        yield chunk(completion_id, model, created, {"role": "assistant", "content": ""})
+        for token in tokens:
+            await asyncio.sleep(1 / TOKENS_PER_SEC)
+            yield chunk(completion_id, model, created, {"content": token})
+        yield chunk(completion_id, model, created, {}, "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens),
+                },
+            }) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/v1/stats")
+async def stats():
+    return {"calls": getattr(app.state, "calls", 0)}
@@ -0,0 +1,188 @@
+"""
+Uploads synthetic problem photos to /ask at a fixed concurrency and reports latency
+percentiles, throughput and event-loop lag (the server's, read from /metrics, and
+this generator's own, so a saturated client is not mistaken for a slow server).
+
+    python -m loadtest.load_generator --url http://localhost:8000 --concurrency 50 --requests 500
+    python -m loadtest.load_generator --stream --duration 60 --users 200
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import httpx
+from PIL import Image, ImageDraw
+
+
+def synthetic_photo(seed: int, width: int = 1600, height: int = 2000) -> bytes:
+    """
+    A phone-photo-sized JPEG of a random "problem page". Every seed gives a different
+    page, so the answer cache and idempotency keys do not collapse the load.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (rng.randint(220, 255),) * 3)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(40, 80)):
+        x, y = rng.randint(0, width - 200), rng.randint(0, height - 40)
+        draw.rectangle([x, y, x + rng.randint(40, 600), y + rng.randint(8, 30)], fill=(rng.randint(0, 80),) * 3)
+    for _ in range(rng.randint(3, 8)):
+        draw.line([rng.randint(0, width), rng.randint(0, height), rng.randint(0, width), rng.randint(0, height)],
+                  fill=(0, 0, 0), width=rng.randint(2, 6))
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, (time.perf_counter() - started - self.interval) * 1000))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Results:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.first_event: List[float] = []
+        self.statuses: Dict[str, int] = {}
+
+    def record(self, status: str, latency_ms: float, first_event_ms: Optional[float] = None):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies.append(latency_ms)
+        if first_event_ms is not None:
+            self.first_event.append(first_event_ms)
+
+
+async def upload(client: httpx.AsyncClient, args, photo: bytes, user_id: str, results: Results):
+    path = f"/ask/{args.subject}/{user_id}" + ("/stream" if args.stream else "")
+    files = {"file": ("photo.jpg", photo, "image/jpeg")}
+    params = {"use_cache": "true" if args.use_cache else "false"}
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    started = time.perf_counter()
+    try:
+        if not args.stream:
+            response = await client.post(path, files=files, params=params, headers=headers)
+            results.record(str(response.status_code), (time.perf_counter() - started) * 1000)
+            return
+
+        first_event_ms = None
+        last_event = "none"
+        async with client.stream("POST", path, files=files, params=params, headers=headers) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    if first_event_ms is None:
+                        first_event_ms = (time.perf_counter() - started) * 1000
+                    last_event = line[len("event: "):]
+        status = str(response.status_code) if response.status_code != 200 else f"200:{last_event}"
+        results.record(status, (time.perf_counter() - started) * 1000, first_event_ms)
+    except httpx.HTTPError as e:
+        results.record(type(e).__name__, (time.perf_counter() - started) * 1000)
+
+
+async def fetch_server_lag(client: httpx.AsyncClient) -> Optional[dict]:
+    try:
+        response = await client.get("/metrics")
+        return response.json().get("histograms", {}).get("event_loop_lag_ms")
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def run(args):
+    print(f"Generating {args.photos} synthetic photos...")
+    photos = [synthetic_photo(args.seed + i) for i in range(args.photos)]
+    user_ids = [f"loadtest-{i}" for i in range(args.users)]
+
+    results = Results()
+    lag = LoopLagMonitor()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        sent = 0
+        deadline = time.perf_counter() + args.duration if args.duration else None
+
+        def next_request():
+            nonlocal sent
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            if deadline is None and sent >= args.requests:
+                return None
+            sent += 1
+            return photos[sent % len(photos)], random.choice(user_ids)
+
+        async def worker():
+            while True:
+                request = next_request()
+                if request is None:
+                    return
+                await upload(client, args, request[0], request[1], results)
+
+        lag.start()
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+        lag.stop()
+
+        server_lag = await fetch_server_lag(client)
+
+    completed = len(results.latencies)
+    print()
+    print(f"requests      {completed} in {elapsed:.1f}s, concurrency {args.concurrency}")
+    print(f"throughput    {completed / elapsed:.2f} req/s")
+    print(f"latency ms    p50 {percentile(results.latencies, 0.50):.0f}  "
+          f"p95 {percentile(results.latencies, 0.95):.0f}  p99 {percentile(results.latencies, 0.99):.0f}  "
+          f"max {max(results.latencies, default=0):.0f}")
+    if results.first_event:
+        print(f"first event   p50 {percentile(results.first_event, 0.50):.0f}  "
+              f"p95 {percentile(results.first_event, 0.95):.0f}  p99 {percentile(results.first_event, 0.99):.0f}")
+    print(f"status        {dict(sorted(results.statuses.items()))}")
+    print(f"client lag ms p50 {percentile(lag.samples, 0.50):.1f}  p99 {percentile(lag.samples, 0.99):.1f}  "
+          f"max {max(lag.samples, default=0):.1f}")
+    if server_lag:
+        print(f"server lag ms p50 {server_lag['p50']}  p99 {server_lag['p99']}  max {server_lag['max']}"
+              f"  (recent window of /metrics)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the /ask upload pipeline")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--subject", default="math")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="total uploads (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="run for this many seconds instead")
+    parser.add_argument("--users", type=int, default=50, help="distinct user ids to spread uploads over")
+    parser.add_argument("--photos", type=int, default=50, help="distinct synthetic photos")
+    parser.add_argument("--stream", action="store_true", help="use POST /ask/{subject}/{user_id}/stream")
+    parser.add_argument("--use-cache", action="store_true", help="let the perceptual-hash answer cache answer")
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
+import asyncio
 import os
 import re
 from urllib.request import Request
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from fastapi import FastAPI
+from fastapi import Request as FastAPIRequest
 from fastapi.middleware.cors import CORSMiddleware
 
 from controller.admin.admin_controller import admin
@@ -12,10 +15,32 @@ from controller.auth.auth_controller import auth
 from controller.question_bank.question_bank_controller import question_bank
 from controller.questions.questions_controller import question
 from controller.test.test_controller import test
+from controller.metrics.metrics_controller import metrics
+from controller.telemetry.telemetry_controller import telemetry
 from database.database import create_db_and_tables, is_latest_migration_applied, \
-    check_model_changes, run_alembic_migration
-
-app = FastAPI()
+    check_model_changes, run_alembic_migration, SessionLocal, apply_pending_revisions
+from service.question_bank.question_bank_service import ensure_question_facets, backfill_layout_metrics
+from service.question_bank.question_index import question_index
+from service.questions.answer_cache import answer_cache, backfill_phash
+from service.questions.conversation_store import conversation_store
+from service.questions.answer_writer import answer_writer
+from service.questions.model_telemetry import model_call_recorder
+from service.questions.user_question_maintenance import ensure_partitions, retire_old_images
+from service.questions.openai_client import init_openai_client, close_openai_client
+from service.questions.model_scheduler import ModelBusyError, busy_message
+from service.responses import FastJSONResponse
+from service.metrics import monitor_event_loop_lag
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+
+@app.exception_handler(ModelBusyError)
+async def model_busy_handler(request: FastAPIRequest, exc: ModelBusyError):
+    return FastJSONResponse(
+        status_code=503,
+        content={"detail": busy_message, "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 localhost_regex = re.compile(r"^http://(localhost|127\.0\.0\.1):\d+$")
 
@@ -33,19 +58,64 @@ scheduler.add_job(
     CronTrigger(minute="*")
 )
 
+# Picks up question bank writes made by other workers
+scheduler.add_job(
+    question_index.reload,
+    IntervalTrigger(minutes=5)
+)
+
+# Picks up /ask answers written by other workers
+scheduler.add_job(
+    answer_cache.reload,
+    IntervalTrigger(minutes=5)
+)
+
+# Drops /test/ask threads idle for longer than CONVERSATION_TTL_SECONDS
+scheduler.add_job(
+    conversation_store.backend.purge_expired,
+    IntervalTrigger(minutes=10)
+)
+
+# Keeps user_questions partitions created ahead of the current month
+scheduler.add_job(
+    ensure_partitions,
+    CronTrigger(hour=3, minute=0)
+)
+
+# Clears full-resolution /ask images older than IMAGE_RETENTION_DAYS
+scheduler.add_job(
+    retire_old_images,
+    CronTrigger(hour=4, minute=0)
+)
+
 # Start the scheduler
 scheduler.start()
 
 
 @app.on_event("startup")
 async def startup_event():
+    init_openai_client()
+    app.state.loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    answer_writer.start()
+    model_call_recorder.start()
     create_db_and_tables()
+    apply_pending_revisions()
     t1 = is_latest_migration_applied()
     t2 = check_model_changes()
     if not t1 or t2:
         # generate_revision()  # Optionally generate a revision if needed
         # run_alembic_migration()  # Run migrations at startup
         run_alembic_migration()
+    ensure_partitions()
+
+    with SessionLocal() as db:
+        ensure_question_facets(db)
+        question_index.load(db)
+        answer_cache.load(db)
+
+    # One-off, in the background: metrics for questions saved before layout_metrics existed
+    scheduler.add_job(backfill_layout_metrics)
+    scheduler.add_job(backfill_phash)
 
 
 localhost_regex = re.compile(r"^(http://localhost:\d+|https://thewell-academy.github.io)$")
@@ -57,6 +127,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor"],  # /ask/history pagination cursor
 )
 
 
@@ -86,11 +157,17 @@ app.include_router(test)
 app.include_router(admin)
 
 app.include_router(question_bank)
+app.include_router(metrics)
+app.include_router(telemetry)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     scheduler.shutdown()
+    app.state.loop_lag_monitor.cancel()
+    await answer_writer.stop()  # drain answers not written yet
+    await model_call_recorder.stop()
+    await close_openai_client()
 
 
 @app.get("/ping")
@@ -0,0 +1 @@
+api_key = "test"
@@ -6,7 +6,7 @@ from sqlmodel import Session
 
 from database.database import engine
 from database.models.user import User
-from fastapi.responses import JSONResponse
+from service.responses import FastJSONResponse
 
 
 def get_students_list():
@@ -21,7 +21,7 @@ def get_students_list():
             query
         )).all()
 
-    return JSONResponse([{
+    return FastJSONResponse([{
         "id": r[0],
         "name": r[1],
     } for r in result])
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+_histograms: Dict[str, "Histogram"] = {}
+
+
+class Histogram:
+    """
+    Count, sum and max over the process lifetime, percentiles over the most recent samples.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pick(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50": round(pick(0.50), 3),
+            "p95": round(pick(0.95), 3),
+            "p99": round(pick(0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+def increment(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+def get_histogram(name: str, **labels) -> Histogram:
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        return histogram
+
+
+def register_gauge(name: str, read: Callable[[], float]):
+    """
+    Gauges are read lazily when the metrics are collected, e.g. a queue's current depth.
+    """
+    with _lock:
+        _gauges[name] = read
+
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: histogram.snapshot() for key, histogram in _histograms.items()}
+
+    return {
+        "counters": counters,
+        "gauges": {name: read() for name, read in gauges.items()},
+        "histograms": histograms,
+    }
+
+
+async def monitor_event_loop_lag(interval: float = 0.25):
+    """
+    Records how late the event loop wakes up from a sleep, i.e. how long something
+    blocked it. Runs as a task for the lifetime of the app.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        observe("event_loop_lag_ms", max(0.0, (time.perf_counter() - started - interval) * 1000))
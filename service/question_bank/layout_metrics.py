@@ -0,0 +1,196 @@
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageFont
+
+from service.question_bank.question_bank_util import font_size, parse_subquestions, rearrange_text_list, \
+    cell_height_pt
+
+default_font_path = "default_font.ttf"
+
+# Geometry of the 2x2 export table (see TableFlowManager._create_new_table)
+cell_width_pt = 3.75 * 72 - 2 * 0.08 * 72  # column width minus Word's default cell margins
+image_width_pt = 3.75 * 72 / 2  # pictures are scaled to half the cell width
+box_width_pt = cell_width_pt * 0.95
+
+# Word's single spacing uses the font's line gap on top of ascent + descent
+line_spacing = 1.2
+
+latex_pattern = r"\[:(.*?)\]"
+number_prefix = "00. "  # width reserved for the question number added at export time
+
+
+@lru_cache(maxsize=1)
+def _font():
+    if not os.path.exists(default_font_path):
+        return None
+    return ImageFont.truetype(default_font_path, 1000)
+
+
+@lru_cache(maxsize=1)
+def line_height_pt() -> float:
+    font = _font()
+    if font is None:
+        return font_size * line_spacing
+    ascent, descent = font.getmetrics()
+    return (ascent + descent) / 1000 * font_size * line_spacing
+
+
+@lru_cache(maxsize=65536)
+def char_width_pt(char: str) -> float:
+    font = _font()
+    if font is not None:
+        return font.getlength(char) / 1000 * font_size
+    # Without the font file, fall back to the usual full-/half-width split (한글 is full width)
+    return font_size * (1.0 if unicodedata.east_asian_width(char) in ("W", "F") else 0.5)
+
+
+def text_width_pt(text: str) -> float:
+    return sum(char_width_pt(char) for char in text)
+
+
+class LineCounter:
+    """
+    Greedy word wrap against the bundled font's advance widths. Only counts lines,
+    it never builds the wrapped strings.
+
+    With lines_per_cell set, it also records where each new cell starts as
+    (delta item index, character offset), so an export can split a long passage
+    across cells without wrapping it again.
+    """
+
+    def __init__(self, width_pt: float, lines_per_cell: int = 0):
+        self.width_pt = width_pt
+        self.lines_per_cell = lines_per_cell
+        self.lines = 1
+        self.x = 0.0
+        self.item_index = 0
+        self.cell_breaks = []
+
+    def newline(self, count: int = 1, offset: int = 0):
+        for _ in range(count):
+            self.lines += 1
+            if self.lines_per_cell and (self.lines - 1) % self.lines_per_cell == 0:
+                self.cell_breaks.append((self.item_index, offset))
+        self.x = 0.0
+
+    def feed(self, text: str, base_offset: int = 0, fixed_offset: int = None):
+        offset = base_offset
+        for line_number, line in enumerate(text.split("\n")):
+            if line_number > 0:
+                self.newline(offset=offset if fixed_offset is None else fixed_offset)
+            for word in re.split(r"( +)", line):
+                if not word:
+                    continue
+                break_offset = offset if fixed_offset is None else fixed_offset
+                word_width = text_width_pt(word)
+                if self.x + word_width <= self.width_pt or word.isspace():
+                    self.x += word_width
+                elif word_width <= self.width_pt:
+                    self.newline(offset=break_offset)
+                    self.x = word_width
+                else:
+                    # A word wider than the cell is broken per character
+                    for char_offset, char in enumerate(word):
+                        char_width = char_width_pt(char)
+                        if self.x + char_width > self.width_pt:
+                            self.newline(offset=offset + char_offset if fixed_offset is None else fixed_offset)
+                        self.x += char_width
+                offset += len(word)
+            offset += 1  # the "\n"
+
+    def feed_latex(self, latex_code: str, offset: int = 0):
+        # OMML rendering is roughly as wide as the LaTeX source without commands,
+        # and a formula is never split: any break inside it moves the whole formula
+        self.feed(re.sub(r"\\[a-zA-Z]+|[{}^_]", "", latex_code), fixed_offset=offset)
+
+
+def _feed_delta_item(counter: LineCounter, text: str):
+    offset = 0
+    for idx, part_text in enumerate(re.split(latex_pattern, text)):
+        if idx % 2 == 0:
+            counter.feed(part_text.rstrip("\n"), base_offset=offset)
+            offset += len(part_text)
+        else:
+            counter.feed_latex(part_text, offset)
+            offset += len(part_text) + 3  # "[:" and "]"
+
+
+def measure_subquestion(question_text_list: List[Dict], answer_option_list: List[List[Dict]],
+                        file_bytes: Optional[bytes] = None, image_size=None) -> Dict:
+    """
+    Mirrors TableFlowManager.add_question_to_cell: question text, a blank line, the optional
+    picture, then one line per answer option item.
+    """
+    question_text_list = rearrange_text_list([{"insert": number_prefix}] + question_text_list)
+    lines_per_cell = int(cell_height_pt // line_height_pt())
+
+    counter = LineCounter(cell_width_pt, lines_per_cell)
+    question_lines = []
+    for idx, item in enumerate(question_text_list):
+        counter.item_index = idx
+        before = counter.lines
+        text = item.get("insert", "")
+        if item.get("attributes", {}).get("box", False):
+            box_counter = LineCounter(box_width_pt)
+            _feed_delta_item(box_counter, text)
+            counter.newline(box_counter.lines + 2)
+        else:
+            _feed_delta_item(counter, text)
+        question_lines.append(counter.lines - before)
+    question_lines[0] += 1  # the first line of the cell
+
+    image_height = 0.0
+    if file_bytes is not None and image_size is not None:
+        image_width, image_height_px = image_size
+        image_height = image_width_pt * image_height_px / image_width if image_width else 0.0
+
+    option_lines = 0
+    for num, answer_option in enumerate(rearrange_text_list(option) for option in answer_option_list):
+        for option_item in answer_option:
+            option_counter = LineCounter(cell_width_pt)
+            _feed_delta_item(option_counter, f"({num + 1}) " + option_item.get("insert", "").replace("\n", ""))
+            option_lines += option_counter.lines
+
+    spacer_lines = 2 + (2 if image_height else 0)
+    total_lines = sum(question_lines) + spacer_lines + option_lines
+
+    return {
+        "line_height": round(line_height_pt(), 2),
+        "lines_per_cell": lines_per_cell,
+        "question_lines": question_lines,
+        "cell_breaks": [list(i) for i in counter.cell_breaks],
+        "option_lines": option_lines,
+        "image_height": round(image_height, 1),
+        "line_count": total_lines,
+        "height": round(total_lines * line_height_pt() + image_height, 1),
+    }
+
+
+def compute_layout_metrics(subquestion_list, file_bytes: Optional[bytes] = None) -> Dict:
+    """
+    Computed once when a question is saved and stored on exam_questions.layout_metrics,
+    so exports can pack cells without measuring any text.
+    """
+    image_size = None
+    if file_bytes:
+        try:
+            image_size = Image.open(BytesIO(file_bytes)).size  # header only, no pixel decode
+        except Exception:
+            image_size = None
+
+    subquestions = [
+        measure_subquestion(question_text_list, answer_option_list, file_bytes, image_size)
+        for question_text_list, answer_option_list in parse_subquestions(subquestion_list)
+    ]
+
+    return {
+        "line_height": round(line_height_pt(), 2),
+        "subquestions": subquestions,
+        "line_count": sum(i["line_count"] for i in subquestions),
+        "height": round(sum(i["height"] for i in subquestions), 1),
+    }
@@ -1,23 +1,45 @@
+import io
 import json
+import random
+import re
+import secrets
 import uuid
-from typing import Dict, List
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 import os
 
 from docx import Document
 from docx.oxml.ns import qn
 from docx.shared import Inches, Pt
-from sqlalchemy import text
+from sqlalchemy import text, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from starlette import status
 from database.models.answer_option_info import AnswerOptionInfo
 from database.models.default_question_info import DefaultQuestionInfo
 from database.models.exam_question import ExamQuestion
+from database.models.question_facet import QuestionFacet
 from database.models.subject_detail import SubjectDetail
-from database.pydantic_models.pydantic_models import ExamQuestionCreate, QuestionRequest
+from database.models.user import User
+from database.pydantic_models.pydantic_models import ExamQuestionCreate, QuestionRequest, VariantExportRequest
 from sqlalchemy.orm.attributes import flag_modified
 import uuid
 
-from service.question_bank.question_bank_util import TableFlowManager, get_passage_text, get_passage_text
+from service.question_bank.question_bank_util import TableFlowManager, get_passage_text, get_passage_text, \
+    parse_subquestions
+from service.question_bank.question_index import question_index
+from service.question_bank.layout_metrics import compute_layout_metrics
+from database.database import SessionLocal
+
+
+@dataclass(slots=True)
+class PreparedQuestion:
+    passage_text: str
+    subquestion_list: List[Tuple[list, list]]
+    answer_list: List[int]
+    file_bytes: Optional[bytes]
+    layout_metrics: Optional[Dict] = None
 
 
 async def save_exam_question(question_request: QuestionRequest, replace: bool, db: Session):
@@ -40,8 +62,10 @@ async def save_exam_question(question_request: QuestionRequest, replace: bool, d
             existing_question = db.query(ExamQuestion).filter(ExamQuestion.id == exist).first()
             if existing_question:
                 existing_question.valid = False
+                update_question_facet(db, existing_question, -1)
                 db.commit()
                 db.refresh(existing_question)
+                question_index.remove(existing_question.id)
             else:
                 return {
                     "status_code": status.HTTP_200_OK,
@@ -67,7 +91,11 @@ async def save_exam_question(question_request: QuestionRequest, replace: bool, d
             type=question_request.question_type,
             question_content_text_map=exam_question_data.question_content_text_map,
             question_numbers=question_numbers,  # Now defined in the model
-            default_question_info=db_default_info  # Correct usage
+            default_question_info=db_default_info,  # Correct usage
+            layout_metrics=measure_question(
+                [(i.question_text, i.options) for i in exam_question_data.answer_option_info_list],
+                exam_question_data.default_question_info.selected_file_bytes
+            )
         )
 
         for answer_option_data in exam_question_data.answer_option_info_list:
@@ -87,8 +115,10 @@ async def save_exam_question(question_request: QuestionRequest, replace: bool, d
             db_exam_question.answer_option_info_list.append(db_answer_option)
 
         db.add(db_exam_question)
+        update_question_facet(db, db_exam_question, 1)
         db.commit()
         db.refresh(db_exam_question)
+        question_index.add(db_exam_question)
         return {
             "status_code": status.HTTP_200_OK,
         }
@@ -98,6 +128,39 @@ async def save_exam_question(question_request: QuestionRequest, replace: bool, d
         }
 
 
+def measure_question(subquestion_list, file_bytes) -> Dict:
+    try:
+        return compute_layout_metrics(subquestion_list, file_bytes)
+    except Exception as e:
+        # Unparseable deltas: the export falls back to one question per cell
+        print(f"Failed to compute layout metrics: {e}")
+        return {}
+
+
+def backfill_layout_metrics(batch_size: int = 100):
+    """
+    Fills layout_metrics for questions saved before it existed. Runs once in the background at startup.
+    """
+    with SessionLocal() as db:
+        while True:
+            exam_question_list = db.query(ExamQuestion).filter(
+                ExamQuestion.layout_metrics.is_(None)
+            ).limit(batch_size).all()
+            if not exam_question_list:
+                break
+
+            for exam_question in exam_question_list:
+                exam_question.layout_metrics = measure_question(
+                    [
+                        (i.question_text, [i.option1, i.option2, i.option3, i.option4, i.option5])
+                        for i in exam_question.answer_option_info_list
+                    ],
+                    exam_question.default_question_info.selected_file_bytes
+                    if exam_question.default_question_info else None
+                )
+            db.commit()
+
+
 def same_question_exists(exam, exam_year, exam_month, question_numbers, subject, grade, db: Session):
     if not isinstance(exam_year, int):
         exam_year = int(exam_year)
@@ -122,6 +185,76 @@ def same_question_exists(exam, exam_year, exam_month, question_numbers, subject,
         return None
 
 
+def update_question_facet(db: Session, exam_question: ExamQuestion, delta: int):
+    """
+    Adds delta to the facet row of the given question. Only stages the statement,
+    the caller commits it together with the exam_questions change.
+    """
+    info = exam_question.default_question_info
+    statement = insert(QuestionFacet).values(
+        subject=exam_question.subject,
+        exam=info.exam or '',
+        exam_year=info.exam_year or 0,
+        exam_month=info.exam_month or 0,
+        grade=info.grade or '',
+        type=exam_question.type or '',
+        count=max(delta, 0),
+    )
+    statement = statement.on_conflict_do_update(
+        constraint='uq_question_facets_key',
+        set_={"count": func.greatest(QuestionFacet.count + delta, 0)},
+    )
+    db.execute(statement)
+
+
+def rebuild_question_facets(db: Session):
+    """
+    Recomputes the whole rollup from exam_questions. Used to backfill an empty facet table.
+    """
+    db.execute(text("delete from question_facets"))
+    db.execute(text("""
+        insert into question_facets (subject, exam, exam_year, exam_month, grade, type, count)
+        select q.subject,
+               coalesce(d.exam, ''),
+               coalesce(d.exam_year, 0),
+               coalesce(d.exam_month, 0),
+               coalesce(d.grade, ''),
+               coalesce(q.type, ''),
+               count(*)
+        from exam_questions q
+        join default_question_infos d on d.id = q.default_question_info_id
+        where q.valid is true
+        group by 1, 2, 3, 4, 5, 6
+    """))
+    db.commit()
+
+
+def ensure_question_facets(db: Session):
+    if db.query(QuestionFacet.id).first() is None:
+        rebuild_question_facets(db)
+
+
+async def get_question_facets(subject: str, exam: str, db: Session):
+    query = db.query(QuestionFacet).filter(QuestionFacet.count > 0)
+    if subject:
+        query = query.filter(QuestionFacet.subject == subject)
+    if exam:
+        query = query.filter(QuestionFacet.exam == exam)
+
+    return [
+        {
+            "subject": facet.subject,
+            "exam": facet.exam,
+            "exam_year": facet.exam_year,
+            "exam_month": facet.exam_month,
+            "grade": facet.grade,
+            "type": facet.type,
+            "count": facet.count,
+        }
+        for facet in query.all()
+    ]
+
+
 async def save_subject_details(subject: str, details: dict, db: Session, parent_id: int = None, path: str = ""):
     for key, value in details.items():
         current_path = f"{path} > {key}" if path else key
@@ -183,8 +316,11 @@ async def delete_question(question_id, db: Session):
 
     default_question_info_id = exam_question.default_question_info_id
 
+    if exam_question.valid:
+        update_question_facet(db, exam_question, -1)
     db.delete(exam_question)
     db.commit()
+    question_index.remove(int(question_id))
 
     if default_question_info_id:
         is_referenced = (
@@ -275,8 +411,59 @@ async def export_question_service(
         years: List[int],
         months: List[int],
         grades: List[str],
-        db: Session
+        db: Session,
+        type_counts: Optional[Dict[str, int]] = None,
+        seed: Optional[int] = None,
 ):
+    if type_counts:
+        existing_question_list = sample_questions(
+            subject, exam, type_counts, years, months, grades, seed, db
+        )
+    else:
+        existing_question_list = query_questions(subject, exam, selections, years, months, grades, db)
+
+    return render_questions(existing_question_list)
+
+
+def sample_questions(
+        subject: str,
+        exam: str,
+        type_counts: Dict[str, int],
+        years: List[int],
+        months: List[int],
+        grades: List[str],
+        seed: Optional[int],
+        db: Session
+) -> List[ExamQuestion]:
+    question_index.ensure_loaded(db)
+
+    if exam == "수능":
+        months, grades = None, None
+
+    sampled_ids = question_index.sample(subject, exam, type_counts, years, months, grades, seed)
+    if not sampled_ids:
+        return []
+
+    question_map = {
+        question.id: question
+        for question in db.query(ExamQuestion).filter(
+            ExamQuestion.id.in_(sampled_ids),
+            ExamQuestion.valid == True,
+        ).all()
+    }
+
+    return [question_map[i] for i in sampled_ids if i in question_map]
+
+
+def query_questions(
+        subject: str,
+        exam: str,
+        selections: List[str],
+        years: List[int],
+        months: List[int],
+        grades: List[str],
+        db: Session
+) -> List[ExamQuestion]:
     if exam == "수능":
         existing_question_query_result = db.query(ExamQuestion).join(DefaultQuestionInfo).filter(
             ExamQuestion.valid == True,
@@ -301,6 +488,34 @@ async def export_question_service(
         for question in existing_question_query_result
     ]
 
+    return existing_question_list
+
+
+def prepare_questions(existing_question_list: List[ExamQuestion]) -> List[PreparedQuestion]:
+    """
+    Loads everything the renderer needs from the ORM objects and parses the deltas once.
+    The result is plain data, safe to render many times after the session is closed.
+    """
+    prepared_list = []
+    for exam_question_class in existing_question_list:
+        answer_option_info_list = exam_question_class.answer_option_info_list
+        prepared_list.append(PreparedQuestion(
+            passage_text=get_passage_text(exam_question_class),
+            subquestion_list=parse_subquestions([
+                (
+                    i.question_text,
+                    [i.option1, i.option2, i.option3, i.option4, i.option5]
+                )
+                for i in answer_option_info_list
+            ]),
+            answer_list=[i.answer for i in answer_option_info_list],
+            file_bytes=exam_question_class.default_question_info.selected_file_bytes,
+            layout_metrics=exam_question_class.layout_metrics
+        ))
+    return prepared_list
+
+
+def create_document() -> Document:
     doc = Document()
 
     section = doc.sections[0]
@@ -325,6 +540,12 @@ async def export_question_service(
     font.element.rPr.rFonts.set(qn('w:hAnsi'), 'CustomFont')  # Applies to high ANSI text
     font.element.rPr.rFonts.set(qn('w:cs'), 'CustomFont')  # Applies to complex scripts
 
+    return doc
+
+
+def render_prepared_questions(prepared_list: List[PreparedQuestion], output):
+    doc = create_document()
+
     manager = TableFlowManager(
         doc,
         max_lines_per_cell=25,
@@ -332,29 +553,143 @@ async def export_question_service(
     )
 
     answer_list = []
-    for i, exam_question_class in enumerate(existing_question_list):
-        passage_text = get_passage_text(exam_question_class)
-
-        manager.add_question(
-            passage_text=passage_text,
-            subquestion_list=[
-                (
-                    i.question_text,
-                    [i.option1, i.option2, i.option3, i.option4, i.option5]
-                )
-                for i in exam_question_class.answer_option_info_list
-            ],
-            file_bytes=exam_question_class.default_question_info.selected_file_bytes
-        )
-
-        for k in exam_question_class.answer_option_info_list:
-            answer_list.append(k.answer)
+    for prepared in prepared_list:
+        manager.add_parsed_question(prepared.subquestion_list, prepared.file_bytes, prepared.layout_metrics)
+        answer_list.extend(prepared.answer_list)
 
     manager.add_answers([
         (i + 1, answer) for i, answer in enumerate(answer_list)
     ])
 
+    doc.save(output)
+
+
+def render_questions(existing_question_list: List[ExamQuestion]):
     output_file = f"{str(uuid.uuid4())}.docx"
-    doc.save(output_file)
+    render_prepared_questions(prepare_questions(existing_question_list), output_file)
 
     return output_file
+
+
+def shuffle_prepared_questions(prepared_list: List[PreparedQuestion], rng: random.Random) -> List[PreparedQuestion]:
+    """
+    Returns a variant with the question order and each question's option order shuffled.
+    Answers are remapped to the new option positions; the parsed deltas themselves are shared.
+    """
+    variant = []
+    for prepared in rng.sample(prepared_list, len(prepared_list)):
+        subquestion_list = []
+        answer_list = []
+        for (question_text_list, answer_options_list), answer in zip(prepared.subquestion_list, prepared.answer_list):
+            if len(answer_options_list) > 1 and 1 <= answer <= len(answer_options_list):
+                order = rng.sample(range(len(answer_options_list)), len(answer_options_list))
+                answer_options_list = [answer_options_list[k] for k in order]
+                answer = order.index(answer - 1) + 1
+            subquestion_list.append((question_text_list, answer_options_list))
+            answer_list.append(answer)
+
+        variant.append(PreparedQuestion(
+            passage_text=prepared.passage_text,
+            subquestion_list=subquestion_list,
+            answer_list=answer_list,
+            file_bytes=prepared.file_bytes,
+            layout_metrics=prepared.layout_metrics,
+        ))
+    return variant
+
+
+class _ZipChunkBuffer(io.RawIOBase):
+    """
+    Write-only, unseekable sink for ZipFile; whatever was written so far is handed out by drain().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+unsafe_entry_characters = re.compile(r"[^\w.-]+")
+
+
+def archive_entry_name(name: str) -> str:
+    # Student names end up in the archive path: no separators, "..", or control characters
+    name = unsafe_entry_characters.sub("_", name)
+    name = re.sub(r"\.{2,}", ".", name).strip("._")
+    return name[:100] or "variant"
+
+
+def iter_variant_zip(prepared_list: List[PreparedQuestion], variant_names: List[str], seed: int):
+    """
+    Renders one .docx per variant name and yields the ZIP archive piece by piece,
+    so the first variant is on the wire before the last one is rendered.
+    """
+    buffer = _ZipChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for number, variant_name in enumerate(variant_names, start=1):
+            rng = random.Random(f"{seed}:{number}")
+            document = io.BytesIO()
+            render_prepared_questions(shuffle_prepared_questions(prepared_list, rng), document)
+            # .docx is already deflated, storing avoids compressing it twice
+            archive.writestr(f"{number:02d}_{archive_entry_name(variant_name)}.docx", document.getvalue())
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def get_variant_names(variant_request: VariantExportRequest, db: Session) -> List[str]:
+    if not variant_request.use_students and not variant_request.user_ids:
+        return [f"variant_{i + 1}" for i in range(variant_request.count)]
+
+    query = db.query(User.id, User.name).filter(
+        User.is_admin.is_not(True),
+        User.is_active.is_(True),
+    )
+    if variant_request.user_ids:
+        query = query.filter(User.id.in_(variant_request.user_ids))
+
+    return [f"{user_id}_{name}" for user_id, name in query.order_by(User.id).all()]
+
+
+async def export_variants_service(variant_request: VariantExportRequest, db: Session):
+    """
+    The ZIP stream and the seed it was shuffled with. Without a seed in the request one
+    is drawn, so every export differs and the returned seed reproduces it.
+    """
+    seed = variant_request.seed if variant_request.seed is not None else secrets.randbits(64)
+
+    if variant_request.question_ids:
+        question_map = {
+            question.id: question
+            for question in db.query(ExamQuestion).filter(
+                ExamQuestion.id.in_(variant_request.question_ids),
+                ExamQuestion.valid == True,
+            ).all()
+        }
+        existing_question_list = [question_map[i] for i in variant_request.question_ids if i in question_map]
+    elif variant_request.type_counts:
+        existing_question_list = sample_questions(
+            variant_request.subject, variant_request.exam, variant_request.type_counts,
+            variant_request.years, variant_request.months, variant_request.grades,
+            seed, db
+        )
+    else:
+        existing_question_list = query_questions(
+            variant_request.subject, variant_request.exam, variant_request.selections,
+            variant_request.years, variant_request.months, variant_request.grades, db
+        )
+
+    prepared_list = prepare_questions(existing_question_list)
+    variant_names = get_variant_names(variant_request, db)
+
+    return iter_variant_zip(prepared_list, variant_names, seed), seed
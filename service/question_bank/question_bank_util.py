@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Dict, Tuple
 from docx import Document
 from docx.shared import Pt, Inches
@@ -20,6 +21,9 @@ from database.models.exam_question import ExamQuestion
 font_name = "Times New Roman"
 font_size = 9
 
+row_height_twips = 7150  # 12.62 cm in Twips
+cell_height_pt = row_height_twips / 20
+
 
 def get_passage_text(exam_question: ExamQuestion):
     if exam_question.subject != "영어":
@@ -150,7 +154,12 @@ def split_text_by_lines(text: str,
     return chunks
 
 
-def create_omml_element(latex_code):
+@lru_cache(maxsize=4096)
+def latex_to_omml(latex_code) -> bytes:
+    """
+    LaTeX -> MathML -> OMML is the slowest step of an export, and the same formulas
+    are rendered again for every worksheet variant, so the serialized result is cached.
+    """
     try:
         mathml = convert(latex_code)
     except Exception as e:
@@ -167,8 +176,14 @@ def create_omml_element(latex_code):
             '<m:oMath xmlns:m="http://schemas.openxmlformats.org/officeDocument/2006/math"'
         )
 
+    return omml.encode('utf-8')
+
+
+def create_omml_element(latex_code):
+    omml = latex_to_omml(latex_code)
+
     try:
-        omml_element = etree.fromstring(omml.encode('utf-8'))
+        omml_element = etree.fromstring(omml)
     except Exception as e:
         raise ValueError(f"Error parsing OMML: {e}")
 
@@ -180,6 +195,47 @@ def insert_omml(paragraph, latex_code):
     paragraph._element.append(omml_element)
 
 
+def parse_delta(delta_text: str) -> List[Dict[str, str]]:
+    return eval(delta_text.replace("true", "True").replace("false", "False"))
+
+
+def parse_subquestions(
+        subquestion_list: List[Tuple[str, List[str]]]
+) -> List[Tuple[List[Dict[str, str]], List[List[Dict[str, str]]]]]:
+    """
+    Parses the stored question/option deltas once. The result is never mutated by
+    TableFlowManager, so it can be rendered into any number of documents.
+    """
+    parsed = []
+    for question_text, options in subquestion_list or []:
+        answer_options_list_is_empty = not any(options)
+        parsed.append((
+            parse_delta(question_text),
+            [parse_delta(i) for i in options] if not answer_options_list_is_empty else []
+        ))
+    return parsed
+
+
+def rearrange_text_list(text_list: List[Dict[str, str]]):
+    if not text_list:  # Handle empty input
+        return []
+
+    result = []
+
+    for item in text_list:
+        insert_value = item.get("insert", "")
+        if insert_value.strip() == "":  # If the insert is empty or only contains \n
+            if result:
+                # Append the empty or newline-only value to the previous item's insert
+                # (copied, parsed deltas are shared between documents)
+                result[-1] = {**result[-1], "insert": result[-1].get("insert", "") + insert_value}
+        else:
+            # Add non-empty items to the result list
+            result.append(item)
+
+    return result
+
+
 class TableFlowManager:
     def __init__(self,
                  doc: Document,
@@ -195,6 +251,12 @@ class TableFlowManager:
         self.page_size = 1
         self.question_number = 0
 
+        # Packing state, in points (see layout_metrics for how question heights are estimated)
+        self.cell_height = cell_height_pt
+        self.current_cell = None
+        self.current_paragraph = None
+        self.used_height = 0.0
+
     def _create_new_table(self):
         table = self.doc.add_table(rows=2, cols=2)
         table.autofit = False
@@ -202,7 +264,6 @@ class TableFlowManager:
         table.columns[0].width = Inches(3.75)
         table.columns[1].width = Inches(3.75)
 
-        row_height_twips = 7150  # 12.62 cm in Twips
         for row in table.rows:
             tr = row._tr
             trHeight = OxmlElement('w:trHeight')
@@ -225,6 +286,23 @@ class TableFlowManager:
         self.cell_index += 1
         return r, c
 
+    def _move_to_next_cell(self):
+        r, c = self._get_next_cell()
+        self.current_cell = self.current_table.cell(r, c)
+        self.current_paragraph = self.current_cell.paragraphs[0]
+        self.used_height = 0.0
+
+    def _take_space(self, height: float, new_question: bool = False):
+        """
+        Reserves height in the current cell, moving on to the next cell when it does not fit.
+        A question packed below another one starts a paragraph of its own.
+        """
+        if self.current_cell is None or (self.used_height > 0 and self.used_height + height > self.cell_height):
+            self._move_to_next_cell()
+        elif new_question and self.used_height > 0:
+            self.current_paragraph = self.current_cell.add_paragraph()
+        self.used_height += height
+
     def _get_next_question_number(self):
         self.question_number += 1
         return self.question_number
@@ -235,49 +313,31 @@ class TableFlowManager:
             subquestion_list: List[Tuple[str, List[str]]] = None,
             file_bytes: bytes = None
     ):
-        if subquestion_list is None:
-            subquestions = []
+        self.add_parsed_question(parse_subquestions(subquestion_list), file_bytes)
 
-        for subquestion in subquestion_list:
-            question_text_list: List[Dict[str, str]] = eval(
-                subquestion[0].replace("true", "True").replace("false", "False")
-            )
-            question_text_list.insert(0, {"insert": f"{self._get_next_question_number()}. "})
-
-            answer_options_list_is_empty = not any(subquestion[1])
-            answer_options_list: List[List[Dict[str, str]]] = [
-                eval(i.replace("true", "True").replace("false", "False"))
-                for i in subquestion[1]
-            ] if not answer_options_list_is_empty else []
+    def add_parsed_question(
+            self,
+            parsed_subquestion_list: List[Tuple[List[Dict[str, str]], List[List[Dict[str, str]]]]],
+            file_bytes: bytes = None,
+            layout_metrics: Dict = None
+    ):
+        subquestion_metrics = (layout_metrics or {}).get("subquestions") or []
+        if len(subquestion_metrics) != len(parsed_subquestion_list):
+            subquestion_metrics = [None] * len(parsed_subquestion_list)
 
+        for (question_text_list, answer_options_list), metrics in zip(parsed_subquestion_list, subquestion_metrics):
             self.add_question_to_cell(
-                question_text_list,
-                answer_options_list,
-                file_bytes
+                [{"insert": f"{self._get_next_question_number()}. "}] + question_text_list,
+                list(answer_options_list),
+                file_bytes,
+                metrics
             )
 
     def add_question_to_cell(self,
                              question_text_list: List[Dict[str, str]],
                              answer_option_list: List[List[Dict[str, str]]],
-                             file_bytes: bytes = None):
-
-        def rearrange_text_list(text_list: List[Dict[str, str]]):
-            if not text_list:  # Handle empty input
-                return []
-
-            result = []
-
-            for item in text_list:
-                insert_value = item.get("insert", "")
-                if insert_value.strip() == "":  # If the insert is empty or only contains \n
-                    if result:
-                        # Append the empty or newline-only value to the previous item's insert
-                        result[-1]["insert"] += insert_value
-                else:
-                    # Add non-empty items to the result list
-                    result.append(item)
-
-            return result
+                             file_bytes: bytes = None,
+                             layout_metrics: Dict = None):
 
         def process_text_parts(paragraph, content_text, content_attributes, process_cell):
             """
@@ -394,40 +454,75 @@ class TableFlowManager:
         for i in range(len(answer_option_list)):
             answer_option_list[i] = rearrange_text_list(answer_option_list[i])
 
-        r, c = self._get_next_cell()
-        cell = self.current_table.cell(r, c)
         latex_pattern = r"\[:(.*?)\]"
 
+        flowing = False
+        cell_breaks = {}
+        if layout_metrics is None:
+            # Without stored metrics every question gets a cell of its own
+            self._move_to_next_cell()
+            self.used_height = self.cell_height
+        elif layout_metrics["height"] <= self.cell_height:
+            self._take_space(layout_metrics["height"], new_question=True)
+        elif len(layout_metrics["question_lines"]) == len(question_text_list):
+            # Longer than a cell: start on a fresh cell and continue into the next ones
+            # at the break offsets measured when the question was saved
+            if self.current_cell is None or self.used_height > 0:
+                self._move_to_next_cell()
+            flowing = True
+            for item_index, offset in layout_metrics["cell_breaks"]:
+                cell_breaks.setdefault(item_index, []).append(offset)
+        else:
+            self._take_space(self.cell_height, new_question=True)
+
         box_group = []  # Holds grouped "box" content
 
-        for question_text in question_text_list:
+        for idx, question_text in enumerate(question_text_list):
             text_content = question_text.get("insert", "")
             text_attributes = question_text.get("attributes", {})
             is_box = text_attributes.get("box", False)
 
             if is_box:
+                if idx in cell_breaks:
+                    self._move_to_next_cell()
                 # Collect content for the box
                 box_group.append((text_content, text_attributes))
             else:
                 # If exiting box mode, add the collected box content as a table
                 if box_group:
-                    add_box_to_cell(cell, box_group)
+                    add_box_to_cell(self.current_cell, box_group)
                     box_group.clear()  # Clear the group after processing
-                    cell.add_paragraph("\n")  # Add a line break after the box
-
-                # Add regular text
-                cell_paragraph = cell.paragraphs[0]
-                process_text_parts(cell_paragraph, text_content, text_attributes, cell)
+                    # Continue below the box
+                    self.current_paragraph = self.current_cell.add_paragraph()
+
+                # Add regular text, moving to the next cell at each measured break
+                start = 0
+                for offset in cell_breaks.get(idx, []):
+                    if text_content[start:offset]:
+                        process_text_parts(
+                            self.current_paragraph, text_content[start:offset], text_attributes, self.current_cell
+                        )
+                    self._move_to_next_cell()
+                    start = offset
+                process_text_parts(self.current_paragraph, text_content[start:], text_attributes, self.current_cell)
 
         # If any box content remains unprocessed, add it as a table
         if box_group:
-            add_box_to_cell(cell, box_group)
+            add_box_to_cell(self.current_cell, box_group)
+            self.current_paragraph = self.current_cell.add_paragraph()
 
-        cell.paragraphs[0].add_run("\n\n")
+        if flowing:
+            line_height = layout_metrics["line_height"]
+            lines_per_cell = layout_metrics["lines_per_cell"]
+            self.used_height = ((sum(layout_metrics["question_lines"]) - 1) % lines_per_cell + 1) * line_height
+            self._take_space(2 * line_height + layout_metrics["image_height"])
+
+        self.current_paragraph.add_run("\n\n")
         # Add the image, if provided
         if file_bytes is not None:
+            cell = self.current_cell
             image_stream = BytesIO(file_bytes)
-            run = cell.paragraphs[0].add_run()
+            run = self.current_paragraph.add_run()
             picture = run.add_picture(image_stream)
 
             # Resize the image to fit the cell width
@@ -441,7 +536,10 @@ class TableFlowManager:
             new_height = int(new_width * aspect_ratio)
             picture.width = new_width
             picture.height = new_height
-            cell.paragraphs[0].add_run("\n\n")
+            self.current_paragraph.add_run("\n\n")
+
+        if flowing:
+            self._take_space(layout_metrics["option_lines"] * line_height)
 
         # Add answer options
         for num, answer_option in enumerate(answer_option_list):
@@ -449,11 +547,8 @@ class TableFlowManager:
                 option_text = f"({num + 1}) " + option_item.get("insert", "")
                 option_text = option_text.replace("\n", "")
                 option_attributes = option_item.get("attributes", {})
-                process_text_parts(cell.paragraphs[0], option_text, option_attributes, cell)
-                cell.paragraphs[0].add_run("\n")
-
-        if r == 1 and c == 1:
-            self._start_new_page_and_table()
+                process_text_parts(self.current_paragraph, option_text, option_attributes, self.current_cell)
+                self.current_paragraph.add_run("\n")
 
     def add_answers(self, answer_list: List[tuple[int, int]]):
         self.doc.add_page_break()
@@ -0,0 +1,142 @@
+import random
+import threading
+from bisect import bisect_right, insort
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.models.default_question_info import DefaultQuestionInfo
+from database.models.exam_question import ExamQuestion
+
+IndexKey = Tuple[str, str, str, int]  # (subject, exam, type, exam_year)
+SubKey = Tuple[int, str]  # (exam_month, grade)
+
+
+class QuestionIdIndex:
+    """
+    In-memory index of valid exam question ids per (subject, exam, type, year),
+    split further by (month, grade) so the non-수능 filters never need a scan.
+
+    Id lists are kept sorted, so the same seed draws the same questions in every worker.
+    Writes through save_exam_question / delete_question update it in place, and the
+    scheduler reloads it periodically to pick up writes made by other workers.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[IndexKey, Dict[SubKey, List[int]]] = {}
+        self._keys: Dict[int, Tuple[IndexKey, SubKey]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def _key_of(exam_question: ExamQuestion) -> Tuple[IndexKey, SubKey]:
+        info = exam_question.default_question_info
+        return (
+            (exam_question.subject, info.exam or '', exam_question.type or '', info.exam_year or 0),
+            (info.exam_month or 0, info.grade or ''),
+        )
+
+    def load(self, db: Session):
+        rows = db.query(
+            ExamQuestion.id,
+            ExamQuestion.subject,
+            ExamQuestion.type,
+            DefaultQuestionInfo.exam,
+            DefaultQuestionInfo.exam_year,
+            DefaultQuestionInfo.exam_month,
+            DefaultQuestionInfo.grade,
+        ).join(DefaultQuestionInfo).filter(
+            ExamQuestion.valid == True,
+        ).order_by(ExamQuestion.id).all()
+
+        buckets: Dict[IndexKey, Dict[SubKey, List[int]]] = {}
+        keys: Dict[int, Tuple[IndexKey, SubKey]] = {}
+        for question_id, subject, question_type, exam, exam_year, exam_month, grade in rows:
+            key = (subject, exam or '', question_type or '', exam_year or 0)
+            sub_key = (exam_month or 0, grade or '')
+            buckets.setdefault(key, {}).setdefault(sub_key, []).append(question_id)
+            keys[question_id] = (key, sub_key)
+
+        with self._lock:
+            self._buckets = buckets
+            self._keys = keys
+            self._loaded = True
+
+    def reload(self):
+        with SessionLocal() as db:
+            self.load(db)
+
+    def ensure_loaded(self, db: Session):
+        if not self._loaded:
+            self.load(db)
+
+    def add(self, exam_question: ExamQuestion):
+        if not self._loaded:
+            return
+        key, sub_key = self._key_of(exam_question)
+        with self._lock:
+            self._remove_locked(exam_question.id)
+            insort(self._buckets.setdefault(key, {}).setdefault(sub_key, []), exam_question.id)
+            self._keys[exam_question.id] = (key, sub_key)
+
+    def remove(self, question_id: int):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove_locked(question_id)
+
+    def _remove_locked(self, question_id: int):
+        location = self._keys.pop(question_id, None)
+        if location is None:
+            return
+        key, sub_key = location
+        ids = self._buckets[key][sub_key]
+        position = bisect_right(ids, question_id) - 1
+        if position >= 0 and ids[position] == question_id:
+            del ids[position]
+
+    def sample(
+            self,
+            subject: str,
+            exam: str,
+            type_counts: Dict[str, int],
+            years: List[int],
+            months: Optional[List[int]] = None,
+            grades: Optional[List[str]] = None,
+            seed: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Draws type_counts[type] distinct ids per type without touching the database.
+        Cost depends on the number of requested questions and matching buckets, not on bank size.
+        """
+        rng = random.Random(seed)
+        month_set = set(months) if months else None
+        grade_set = set(grades) if grades else None
+
+        sampled: List[int] = []
+        with self._lock:
+            for question_type, count in type_counts.items():
+                id_lists = []
+                for year in sorted(set(years)):
+                    sub_buckets = self._buckets.get((subject, exam, question_type, year), {})
+                    for (month, grade) in sorted(sub_buckets):
+                        if month_set is not None and month not in month_set:
+                            continue
+                        if grade_set is not None and grade not in grade_set:
+                            continue
+                        if sub_buckets[(month, grade)]:
+                            id_lists.append(sub_buckets[(month, grade)])
+
+                offsets = list(accumulate(len(ids) for ids in id_lists))
+                total = offsets[-1] if offsets else 0
+                for position in rng.sample(range(total), min(count, total)):
+                    list_index = bisect_right(offsets, position)
+                    start = offsets[list_index - 1] if list_index > 0 else 0
+                    sampled.append(id_lists[list_index][position - start])
+
+        return sampled
+
+
+question_index = QuestionIdIndex()
@@ -0,0 +1,169 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from service import metrics
+from service.questions.config import ANSWER_CACHE_MAX_DISTANCE
+from service.questions.phash import MultiIndexHash, compute_phash
+
+# Rows are written in batches by each worker, so one may commit with a created_at just
+# before the newest row already seen; incremental reloads re-read this much and re-adding
+# a known hash is a no-op
+reload_overlap = timedelta(minutes=2)
+
+
+class AnswerCache:
+    """
+    Per-subject index from the perceptual hash of answered uploads to their user_questions id.
+    Only ids live in memory; a hit costs one primary-key read for the stored answer.
+
+    answer_question adds rows as they are written. The index is built in full at startup,
+    and the scheduler reloads it periodically with only the rows created since the last
+    load, to pick up answers written by other workers.
+    """
+
+    def __init__(self, max_distance: int = ANSWER_CACHE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._indexes: Dict[str, MultiIndexHash] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(index) for index in self._indexes.values())
+
+    def load(self, db: Session):
+        rows = db.execute(text("""
+            SELECT id, subject, phash, created_at FROM user_questions
+            WHERE phash IS NOT NULL
+            ORDER BY created_at
+        """))
+
+        indexes: Dict[str, MultiIndexHash] = {}
+        loaded_until = None
+        for question_id, subject, phash, created_at in rows:
+            indexes.setdefault(subject, MultiIndexHash()).add(phash, question_id)
+            loaded_until = created_at
+
+        with self._lock:
+            self._indexes = indexes
+            self._loaded_until = loaded_until
+
+    def load_new(self, db: Session):
+        """
+        Adds the rows created since the last load; the partition key keeps this to the
+        newest partition instead of a scan of every phash row.
+        """
+        if self._loaded_until is None:
+            self.load(db)
+            return
+
+        rows = db.execute(text("""
+            SELECT id, subject, phash, created_at FROM user_questions
+            WHERE phash IS NOT NULL AND created_at >= :since
+            ORDER BY created_at
+        """), {"since": self._loaded_until - reload_overlap}).all()
+        if not rows:
+            return
+
+        with self._lock:
+            for question_id, subject, phash, created_at in rows:
+                self._indexes.setdefault(subject, MultiIndexHash()).add(phash, question_id)
+            self._loaded_until = max(self._loaded_until, rows[-1].created_at)
+
+    def reload(self, full: bool = False):
+        with SessionLocal() as db:
+            if full:
+                self.load(db)
+            else:
+                self.load_new(db)
+
+    def add(self, subject: str, phash: Optional[int], question_id: str):
+        if phash is None:
+            return
+        with self._lock:
+            self._indexes.setdefault(subject, MultiIndexHash()).add(phash, question_id)
+
+    def lookup(self, subject: str, phash: Optional[int]) -> Optional[str]:
+        """
+        Id of the closest previously answered upload within max_distance bits, or None.
+        """
+        if phash is None:
+            return None
+
+        started = time.perf_counter()
+        with self._lock:
+            index = self._indexes.get(subject)
+            match = index.nearest(phash, self.max_distance) if index is not None else None
+        metrics.observe("answer_cache_lookup_ms", (time.perf_counter() - started) * 1000)
+
+        if match is None:
+            metrics.increment("answer_cache_lookups", result="miss")
+            return None
+
+        distance, question_id = match
+        metrics.increment("answer_cache_lookups", result="hit")
+        metrics.observe("answer_cache_hit_distance", distance)
+        return question_id
+
+    def get_answer(self, subject: str, phash: Optional[int]) -> Optional[str]:
+        question_id = self.lookup(subject, phash)
+        if question_id is None:
+            return None
+        with SessionLocal() as db:
+            return db.execute(
+                text("SELECT answer FROM user_questions WHERE id = :id"), {"id": question_id}
+            ).scalar()
+
+
+def backfill_phash(batch_size: int = 200):
+    """
+    Hashes the thumbnails of rows written before the phash column existed,
+    then rebuilds the cache so they can be matched too.
+    """
+    updated = 0
+    failed = []
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(text("""
+                SELECT id, image_small FROM user_questions
+                WHERE phash IS NULL AND image_small IS NOT NULL AND NOT (id = ANY(:failed))
+                LIMIT :batch_size
+            """), {"batch_size": batch_size, "failed": failed}).all()
+            if not rows:
+                break
+
+            for question_id, image_small in rows:
+                try:
+                    phash = compute_phash(image_small)
+                except Exception as e:
+                    print(f"phash backfill failed for {question_id}: {e}")
+                    failed.append(question_id)
+                    continue
+                db.execute(
+                    text("UPDATE user_questions SET phash = :phash WHERE id = :id"),
+                    {"phash": phash, "id": question_id},
+                )
+            db.commit()
+            updated += len(rows)
+
+    print(f"phash backfill: {updated} rows")
+    if updated:
+        # These rows are older than the last load, so an incremental reload would skip them
+        answer_cache.reload(full=True)
+
+
+def _hit_rate() -> float:
+    hits = metrics.get_counter("answer_cache_lookups", result="hit")
+    misses = metrics.get_counter("answer_cache_lookups", result="miss")
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+
+answer_cache = AnswerCache()
+
+metrics.register_gauge("answer_cache_size", lambda: len(answer_cache))
+metrics.register_gauge("answer_cache_hit_rate", _hit_rate)
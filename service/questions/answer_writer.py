@@ -0,0 +1,151 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+from database.models import crud
+from database.models.user_question import UserQuestion
+from service import metrics
+from service.questions.answer_cache import answer_cache
+from service.questions.config import ANSWER_WRITER_QUEUE_MAX, ANSWER_WRITER_BATCH_SIZE, \
+    ANSWER_WRITER_FLUSH_INTERVAL, ANSWER_WRITER_RETRY_ATTEMPTS, ANSWER_WRITER_DRAIN_TIMEOUT
+
+
+def is_transient(error: Exception) -> bool:
+    # Dropped connections, failovers and an exhausted pool are worth retrying; bad rows are not
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class AnswerWriter:
+    """
+    Write-behind queue for answered UserQuestion rows, so /ask returns as soon as the model
+    has answered. One background task collects up to ANSWER_WRITER_BATCH_SIZE rows (or what
+    arrives within ANSWER_WRITER_FLUSH_INTERVAL) and writes them with one multi-row INSERT
+    on a worker thread, retrying transient database errors with backoff.
+
+    The queue is bounded: when it is full, submit waits for room instead of growing memory.
+    Rows are added to the answer cache once they are written, and until then pending()
+    still finds them, so a follow-up right after the answer works.
+    """
+
+    def __init__(self, max_size: int = ANSWER_WRITER_QUEUE_MAX, batch_size: int = ANSWER_WRITER_BATCH_SIZE,
+                 flush_interval: float = ANSWER_WRITER_FLUSH_INTERVAL,
+                 retry_attempts: int = ANSWER_WRITER_RETRY_ATTEMPTS):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_attempts = retry_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, UserQuestion] = {}
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, user_questions: List[UserQuestion]):
+        if not user_questions:
+            return
+        if self._task is None or self._task.done():
+            # Not started (scripts, or after shutdown): write inline
+            await self._flush(list(user_questions))
+            return
+
+        for user_question in user_questions:
+            self._pending[user_question.id] = user_question
+            if self._queue.full():
+                metrics.increment("answer_writer_backpressure")
+            await self._queue.put(user_question)
+
+    def pending(self, question_id: str) -> Optional[UserQuestion]:
+        return self._pending.get(question_id)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[UserQuestion]):
+        started = time.perf_counter()
+        try:
+            await self._insert_with_retry(batch)
+            written = batch
+        except Exception as e:
+            if is_transient(e) or len(batch) == 1:
+                print(f"Failed to write answered questions: {e} (ids: {[row.id for row in batch]})")
+                written = []
+            else:
+                # One bad row must not lose the whole batch: write the rows one at a time
+                written = [row for row in batch if await self._insert_one(row)]
+        finally:
+            for row in batch:
+                self._pending.pop(row.id, None)
+
+        metrics.observe("answer_writer_flush_ms", (time.perf_counter() - started) * 1000)
+        metrics.observe("answer_writer_batch_rows", len(batch))
+        metrics.increment("answer_writer_rows", len(written), result="written")
+        if len(batch) > len(written):
+            metrics.increment("answer_writer_rows", len(batch) - len(written), result="failed")
+
+        for row in written:
+            answer_cache.add(row.subject, row.phash, row.id)
+
+    async def _insert_one(self, row: UserQuestion) -> bool:
+        try:
+            await self._insert_with_retry([row])
+            return True
+        except Exception as e:
+            print(f"Failed to write answered question {row.id}: {e}")
+            return False
+
+    async def _insert_with_retry(self, rows: List[UserQuestion]):
+        for attempt in range(self.retry_attempts):
+            try:
+                await asyncio.to_thread(crud.insert_many, rows)
+                return
+            except Exception as e:
+                if not is_transient(e) or attempt == self.retry_attempts - 1:
+                    raise
+                metrics.increment("answer_writer_retries")
+                await asyncio.sleep(random.uniform(0, min(5.0, 0.2 * 2 ** attempt)))
+
+    async def stop(self, timeout: float = ANSWER_WRITER_DRAIN_TIMEOUT):
+        """
+        Waits for everything queued to be written, then stops the background task.
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Answer writer drain timed out, {self.depth} rows not written")
+        self._task.cancel()
+        self._task = None
+
+
+answer_writer = AnswerWriter()
+
+metrics.register_gauge("answer_writer_queue_depth", lambda: answer_writer.depth)
@@ -0,0 +1,111 @@
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file
+
+# Outbound HTTP pool shared by every model call (see openai_client.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # e.g. http://localhost:9000/v1 for loadtest/fake_openai_server.py
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))  # retries are done by model_scheduler.py
+
+# Upload preprocessing (see image_processing.py)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "4"))
+MODEL_IMAGE_MAX_DIMENSION = int(os.getenv("MODEL_IMAGE_MAX_DIMENSION", "1536"))
+MODEL_IMAGE_FORMAT = os.getenv("MODEL_IMAGE_FORMAT", "JPEG")  # JPEG or WEBP
+MODEL_IMAGE_QUALITY = int(os.getenv("MODEL_IMAGE_QUALITY", "85"))
+THUMBNAIL_MAX_DIMENSION = int(os.getenv("THUMBNAIL_MAX_DIMENSION", "320"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "JPEG")  # JPEG or WEBP
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+
+# Perceptual-hash answer cache (see answer_cache.py)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_DISTANCE = int(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "6"))  # bits out of 64
+
+# Idempotent /ask uploads (see idempotency.py)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Outbound model-call scheduler (see model_scheduler.py)
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "32"))
+MODEL_TOKENS_PER_MINUTE = int(os.getenv("MODEL_TOKENS_PER_MINUTE", "800000"))  # 0 disables the token budget
+MODEL_QUEUE_MAX = int(os.getenv("MODEL_QUEUE_MAX", "200"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("MODEL_QUEUE_TIMEOUT", "20"))  # seconds a call may wait for a slot
+MODEL_RETRY_ATTEMPTS = int(os.getenv("MODEL_RETRY_ATTEMPTS", "3"))
+MODEL_RETRY_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5"))
+MODEL_RETRY_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", "8"))
+
+# /test/ask conversation threads (see conversation_store.py)
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory")  # memory or sql
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+CONVERSATION_MAX_THREADS = int(os.getenv("CONVERSATION_MAX_THREADS", "10000"))
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", str(64 * 1024 * 1024)))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "100"))
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "3000"))
+
+# POST /ask/{subject}/{user_id}/batch
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "10"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))  # model calls per batch request
+
+# POST /ask/followup/{question_id}
+FOLLOWUP_MODEL = os.getenv("FOLLOWUP_MODEL", "gpt-4o-mini")
+FOLLOWUP_MAX_TOKENS = int(os.getenv("FOLLOWUP_MAX_TOKENS", "800"))
+FOLLOWUP_CONTEXT_LINES = int(os.getenv("FOLLOWUP_CONTEXT_LINES", "3"))  # lines around the asked line
+FOLLOWUP_FULL_ANSWER_TOKENS = int(os.getenv("FOLLOWUP_FULL_ANSWER_TOKENS", "1200"))  # shorter answers are sent whole
+
+# Two-tier routing (see triage.py). MODEL_ROUTING overrides any of these per subject, e.g.
+# {"science": {"solver_model": "gpt-4o", "threshold": 0.6}, "english": {"triage_enabled": false}}
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "true").lower() == "true"
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "gpt-4o-mini")
+TRIAGE_THRESHOLD = float(os.getenv("TRIAGE_THRESHOLD", "0.5"))  # P("1") needed to escalate to the solver
+SOLVER_MODEL = os.getenv("SOLVER_MODEL", "gpt-4o")
+SOLVER_MAX_TOKENS = int(os.getenv("SOLVER_MAX_TOKENS", "3000"))
+MODEL_ROUTING = json.loads(os.getenv("MODEL_ROUTING", "{}"))
+
+# Local blur/exposure check before any model call (see quality_gate.py). QUALITY_GATE_THRESHOLDS
+# overrides any of these per subject, e.g. {"english": {"min_sharpness": 20}}
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "true").lower() == "true"
+QUALITY_GATE_DIMENSION = int(os.getenv("QUALITY_GATE_DIMENSION", "512"))  # long side of the grayscale copy
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "25"))  # variance of the Laplacian
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))  # mean gray level, 0-255
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "250"))
+QUALITY_MAX_CLIPPED = float(os.getenv("QUALITY_MAX_CLIPPED", "0.85"))  # share of pixels at 0-5 or 250-255
+QUALITY_MIN_TEXT_CONTRAST = float(os.getenv("QUALITY_MIN_TEXT_CONTRAST", "10"))
+QUALITY_GATE_THRESHOLDS = json.loads(os.getenv("QUALITY_GATE_THRESHOLDS", "{}"))
+
+# Write-behind persistence of answered questions (see answer_writer.py)
+ANSWER_WRITER_QUEUE_MAX = int(os.getenv("ANSWER_WRITER_QUEUE_MAX", "1000"))
+ANSWER_WRITER_BATCH_SIZE = int(os.getenv("ANSWER_WRITER_BATCH_SIZE", "50"))
+ANSWER_WRITER_FLUSH_INTERVAL = float(os.getenv("ANSWER_WRITER_FLUSH_INTERVAL", "0.2"))  # seconds to fill a batch
+ANSWER_WRITER_RETRY_ATTEMPTS = int(os.getenv("ANSWER_WRITER_RETRY_ATTEMPTS", "5"))
+ANSWER_WRITER_DRAIN_TIMEOUT = float(os.getenv("ANSWER_WRITER_DRAIN_TIMEOUT", "20"))  # seconds, on shutdown
+
+# user_questions monthly partitions and image retention (see user_question_maintenance.py)
+USER_QUESTION_PARTITIONS_AHEAD = int(os.getenv("USER_QUESTION_PARTITIONS_AHEAD", "3"))  # months created in advance
+IMAGE_RETENTION_DAYS = int(os.getenv("IMAGE_RETENTION_DAYS", "365"))  # full-resolution images older than this are retired, 0 keeps them
+IMAGE_ARCHIVE_DIR = os.getenv("IMAGE_ARCHIVE_DIR", "")  # retired images are written here first; empty drops them
+IMAGE_RETENTION_BATCH_SIZE = int(os.getenv("IMAGE_RETENTION_BATCH_SIZE", "200"))
+
+# Per-call model telemetry (see model_telemetry.py). Prices are USD per 1M tokens.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))  # seconds
+TELEMETRY_MAX_BUFFER = int(os.getenv("TELEMETRY_MAX_BUFFER", "10000"))  # rows kept while the database is away
+MODEL_PRICES = json.loads(os.getenv("MODEL_PRICES", json.dumps({
+    "gpt-4o": {"input": 2.5, "output": 10.0},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.6},
+    "gpt-3.5-turbo": {"input": 0.5, "output": 1.5},
+})))
+
+# Tail latency of model calls (see model_scheduler.py)
+MODEL_DEADLINE_SECONDS = float(os.getenv("MODEL_DEADLINE_SECONDS", "90"))  # queue wait, retries and hedges included
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))  # a duplicate goes out once a call is this slow
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))  # at most this share of calls is hedged
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))  # seconds
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))  # latencies needed before hedging a model
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))  # recent latencies kept per model
@@ -0,0 +1,227 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from database.database import SessionLocal
+from database.models.conversation_thread import ConversationThread
+from service import metrics
+from service.questions.config import CONVERSATION_BACKEND, CONVERSATION_TTL_SECONDS, CONVERSATION_MAX_THREADS, \
+    CONVERSATION_MAX_BYTES, CONVERSATION_MAX_MESSAGES, CONVERSATION_TOKEN_BUDGET
+
+message_overhead_tokens = 4  # role and separators the chat format adds per message
+message_overhead_bytes = 120  # Python object overhead per stored message
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cheap upper-bound estimate without a tokenizer: about 4 ASCII characters per token,
+    and one token per character for 한글 and other non-ASCII text.
+    """
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars) + message_overhead_tokens
+
+
+@dataclass(slots=True)
+class Message:
+    role: str
+    content: str
+    tokens: int  # counted once when the message is added, never again
+
+    @classmethod
+    def create(cls, role: str, content: str):
+        return cls(role=role, content=content, tokens=count_tokens(content))
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content, "tokens": self.tokens}
+
+    @classmethod
+    def from_dict(cls, value: dict):
+        return cls(value["role"], value["content"], value.get("tokens") or count_tokens(value["content"]))
+
+    def size(self) -> int:
+        return len(self.content.encode()) + message_overhead_bytes
+
+
+class InMemoryConversationBackend:
+    """
+    Per-worker LRU of threads. Threads idle for longer than ttl are dropped, and the least
+    recently used ones are evicted while there are more than max_threads or their
+    messages take more than max_bytes.
+    """
+
+    def __init__(self, ttl: float = CONVERSATION_TTL_SECONDS, max_threads: int = CONVERSATION_MAX_THREADS,
+                 max_bytes: int = CONVERSATION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._threads: "OrderedDict[str, Tuple[float, int, List[Message]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._threads)
+
+    def load(self, user_id: str) -> List[Message]:
+        with self._lock:
+            entry = self._threads.get(user_id)
+            if entry is None:
+                return []
+            used_at, size, messages = entry
+            if time.monotonic() - used_at > self.ttl:
+                self._drop(user_id)
+                metrics.increment("conversation_evictions", reason="ttl")
+                return []
+            self._threads[user_id] = (time.monotonic(), size, messages)
+            self._threads.move_to_end(user_id)
+            return list(messages)
+
+    def save(self, user_id: str, messages: List[Message]):
+        size = sum(message.size() for message in messages)
+        with self._lock:
+            self._drop(user_id)
+            self._threads[user_id] = (time.monotonic(), size, list(messages))
+            self.bytes += size
+            self._evict()
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._drop(user_id)
+
+    def purge_expired(self):
+        with self._lock:
+            self._evict()
+
+    def _drop(self, user_id: str):
+        entry = self._threads.pop(user_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._threads:
+            user_id, (used_at, _, _) = next(iter(self._threads.items()))
+            if now - used_at > self.ttl:
+                reason = "ttl"
+            elif len(self._threads) > self.max_threads or self.bytes > self.max_bytes:
+                reason = "size"
+            else:
+                break
+            self._drop(user_id)
+            metrics.increment("conversation_evictions", reason=reason)
+
+
+class SQLConversationBackend:
+    """
+    Threads in the conversation_threads table, so they survive restarts and every worker
+    sees the same thread. Expired threads are removed by purge_expired on the scheduler.
+    """
+
+    def __init__(self, ttl: float = CONVERSATION_TTL_SECONDS):
+        self.ttl = ttl
+
+    def _expired_before(self) -> datetime.datetime:
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=self.ttl)
+
+    def load(self, user_id: str) -> List[Message]:
+        with SessionLocal() as db:
+            thread = db.get(ConversationThread, user_id)
+            if thread is None or thread.updated_at < self._expired_before():
+                return []
+            return [Message.from_dict(message) for message in thread.messages]
+
+    def save(self, user_id: str, messages: List[Message]):
+        values = {
+            "user_id": user_id,
+            "messages": [message.to_dict() for message in messages],
+            "updated_at": datetime.datetime.utcnow(),
+        }
+        statement = insert(ConversationThread).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ConversationThread.user_id],
+            set_={"messages": statement.excluded.messages, "updated_at": statement.excluded.updated_at},
+        )
+        with SessionLocal() as db:
+            db.execute(statement)
+            db.commit()
+
+    def delete(self, user_id: str):
+        with SessionLocal() as db:
+            db.execute(delete(ConversationThread).where(ConversationThread.user_id == user_id))
+            db.commit()
+
+    def purge_expired(self):
+        with SessionLocal() as db:
+            result = db.execute(
+                delete(ConversationThread).where(ConversationThread.updated_at < self._expired_before())
+            )
+            db.commit()
+        metrics.increment("conversation_evictions", result.rowcount, reason="ttl")
+
+
+class ConversationStore:
+    """
+    Conversation threads per user on a pluggable backend. A stored thread keeps at most
+    max_messages messages, and each call sends only the newest messages that fit
+    token_budget, using the token counts stored with every message.
+    """
+
+    def __init__(self, backend, token_budget: int = CONVERSATION_TOKEN_BUDGET,
+                 max_messages: int = CONVERSATION_MAX_MESSAGES):
+        self.backend = backend
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+
+    def prompt(self, user_id: str, system_message: Dict[str, str], question: str) -> Tuple[List[dict], List[Message]]:
+        """
+        (messages to send, thread including the new question). The system message and the
+        question are always sent; older turns are dropped from the front to fit the budget.
+        """
+        thread = self.backend.load(user_id)
+        thread.append(Message.create("user", question))
+
+        system = Message.create(system_message["role"], system_message["content"])
+        budget = self.token_budget - system.tokens
+        selected: List[Message] = []
+        for message in reversed(thread):
+            if selected and budget - message.tokens < 0:
+                break
+            budget -= message.tokens
+            selected.append(message)
+        # Never start the window on an assistant reply without the question it answered
+        while len(selected) > 1 and selected[-1].role == "assistant":
+            selected.pop()
+        selected.reverse()
+
+        metrics.observe("conversation_prompt_tokens", self.token_budget - budget)
+        metrics.increment("conversation_trimmed_messages", len(thread) - len(selected))
+        messages = [{"role": system.role, "content": system.content}]
+        messages += [{"role": message.role, "content": message.content} for message in selected]
+        return messages, thread
+
+    def append_reply(self, user_id: str, thread: List[Message], reply: str):
+        thread.append(Message.create("assistant", reply))
+        self.backend.save(user_id, thread[-self.max_messages:])
+
+    def reset(self, user_id: str):
+        self.backend.delete(user_id)
+
+
+def create_backend(name: str = CONVERSATION_BACKEND):
+    if name == "sql":
+        return SQLConversationBackend()
+    if name == "memory":
+        return InMemoryConversationBackend()
+    raise ValueError(f"Unknown CONVERSATION_BACKEND: {name}")
+
+
+conversation_store = ConversationStore(create_backend())
+
+if isinstance(conversation_store.backend, InMemoryConversationBackend):
+    metrics.register_gauge("conversation_threads", lambda: len(conversation_store.backend))
+    metrics.register_gauge("conversation_bytes", lambda: conversation_store.backend.bytes)
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from service import metrics
+from service.questions.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES
+
+
+class IdempotentCallAborted(Exception):
+    """
+    The call a duplicate was waiting on ended without a result (error or client gone).
+    """
+
+
+def derive_idempotency_key(scope: str, user_id: str, subject: str, contents: bytes, header_key: Optional[str] = None) -> str:
+    """
+    The client's Idempotency-Key when it sends one, otherwise a hash of who asked what
+    about which image, so a blind retry of the same upload still maps to the same call.
+    Keys are always scoped to the user and endpoint.
+    """
+    if header_key:
+        return f"{scope}:{user_id}:key:{header_key}"
+    digest = hashlib.sha256()
+    digest.update(user_id.encode())
+    digest.update(b"\0")
+    digest.update(subject.encode())
+    digest.update(b"\0")
+    digest.update(contents)
+    return f"{scope}:{user_id}:sha256:{digest.hexdigest()}"
+
+
+class IdempotencyStore:
+    """
+    Single-flight map of in-progress calls plus a TTL/LRU store of finished results,
+    per worker process. The first request for a key runs the call, concurrent duplicates
+    await the same future, and later retries get the stored result replayed.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def _purge(self, now: float):
+        while self._results:
+            key, (expires_at, _) = next(iter(self._results.items()))
+            if expires_at > now and len(self._results) <= self.max_entries:
+                break
+            del self._results[key]
+
+    def completed(self, key: str):
+        """
+        (True, result) for a finished call still within the TTL, else (False, None).
+        """
+        self._purge(time.monotonic())
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        metrics.increment("idempotency_requests", result="replayed")
+        return True, entry[1]
+
+    def in_flight(self, key: str) -> Optional[asyncio.Future]:
+        future = self._in_flight.get(key)
+        if future is not None:
+            metrics.increment("idempotency_requests", result="coalesced")
+        return future
+
+    def begin(self, key: str) -> asyncio.Future:
+        metrics.increment("idempotency_requests", result="executed")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        return future
+
+    def finish(self, key: str, result, store: bool = True):
+        future = self._in_flight.pop(key, None)
+        if store:
+            now = time.monotonic()
+            self._results[key] = (now + self.ttl, result)
+            self._results.move_to_end(key)
+            self._purge(now)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def abort(self, key: str, exception: Optional[BaseException] = None):
+        future = self._in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(exception or IdempotentCallAborted(key))
+            future.exception()  # retrieved here so an unawaited future does not log a warning
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]],
+                  store_if: Callable[[Any], bool] = lambda result: True):
+        found, result = self.completed(key)
+        if found:
+            return result
+
+        future = self.in_flight(key)
+        if future is not None:
+            # shield: a duplicate that disconnects must not cancel the shared call
+            return await asyncio.shield(future)
+
+        self.begin(key)
+        try:
+            result = await call()
+        except BaseException as e:
+            self.abort(key, e if isinstance(e, Exception) else None)
+            raise
+        self.finish(key, result, store=store_if(result))
+        return result
+
+
+idempotency_store = IdempotencyStore()
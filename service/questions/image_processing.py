@@ -0,0 +1,94 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from service import metrics
+from service.questions.config import IMAGE_WORKERS, MODEL_IMAGE_MAX_DIMENSION, MODEL_IMAGE_FORMAT, \
+    MODEL_IMAGE_QUALITY, THUMBNAIL_MAX_DIMENSION, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY
+
+# Pillow releases the GIL while decoding, resizing and encoding, so a thread pool
+# keeps the event loop free without the cost of shipping bytes to another process.
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+
+_mime_types = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+@dataclass(slots=True)
+class ModelImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+    original_mime_type: str
+    elapsed_ms: float
+
+
+def prepare_model_image(contents: bytes) -> ModelImage:
+    """
+    Rotates the photo upright from its EXIF orientation, shrinks it to the configured
+    maximum dimension and recompresses it. The model never needs the full phone resolution.
+    """
+    started = time.perf_counter()
+
+    image = Image.open(BytesIO(contents))
+    original_mime_type = Image.MIME.get(image.format, "application/octet-stream")
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MODEL_IMAGE_MAX_DIMENSION, MODEL_IMAGE_MAX_DIMENSION), Image.LANCZOS)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    output = BytesIO()
+    image.save(output, format=MODEL_IMAGE_FORMAT, quality=MODEL_IMAGE_QUALITY)
+    data = output.getvalue()
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("image_preprocess_ms", elapsed_ms)
+    metrics.observe("image_original_bytes", len(contents))
+    metrics.observe("image_payload_bytes", len(data))
+
+    return ModelImage(
+        data=data,
+        mime_type=_mime_types.get(MODEL_IMAGE_FORMAT, "image/jpeg"),
+        width=image.width,
+        height=image.height,
+        original_size=len(contents),
+        original_mime_type=original_mime_type,
+        elapsed_ms=elapsed_ms,
+    )
+
+
+@dataclass(slots=True)
+class Thumbnail:
+    data: bytes
+    mime_type: str
+
+
+def make_thumbnail(contents: bytes) -> Thumbnail:
+    """
+    Thumbnail inside a fixed THUMBNAIL_MAX_DIMENSION box. For JPEG uploads, draft mode lets the
+    decoder skip straight to a 1/2, 1/4 or 1/8 scale, so the full-resolution pixels are never decoded.
+    """
+    started = time.perf_counter()
+
+    image = Image.open(BytesIO(contents))
+    image.draft("RGB", (THUMBNAIL_MAX_DIMENSION, THUMBNAIL_MAX_DIMENSION))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((THUMBNAIL_MAX_DIMENSION, THUMBNAIL_MAX_DIMENSION), Image.LANCZOS, reducing_gap=2.0)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    output = BytesIO()
+    image.save(output, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+
+    metrics.observe("thumbnail_ms", (time.perf_counter() - started) * 1000)
+
+    return Thumbnail(data=output.getvalue(), mime_type=_mime_types.get(THUMBNAIL_FORMAT, "image/jpeg"))
+
+
+async def run_in_image_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
@@ -0,0 +1,385 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+import numpy as np
+import openai
+
+from service import metrics
+from service.questions.config import MODEL_MAX_CONCURRENCY, MODEL_TOKENS_PER_MINUTE, MODEL_QUEUE_MAX, \
+    MODEL_QUEUE_TIMEOUT, MODEL_RETRY_ATTEMPTS, MODEL_RETRY_BASE_DELAY, MODEL_RETRY_MAX_DELAY, \
+    MODEL_DEADLINE_SECONDS, HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_BUDGET, HEDGE_MIN_DELAY, HEDGE_MIN_SAMPLES, \
+    HEDGE_WINDOW
+
+busy_message = "지금 질문이 많아 답변이 늦어지고 있어요. 잠시 후 다시 시도해주세요."
+
+
+class ModelBusyError(Exception):
+    """
+    No model-call slot within the queue limits. Mapped to 503 with Retry-After.
+    """
+
+    def __init__(self, reason: str, retry_after: int = 5):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ModelDeadlineError(ModelBusyError):
+    """
+    The call did not finish within MODEL_DEADLINE_SECONDS, queue wait and retries included.
+    Handled like any other ModelBusyError, so the student is asked to try again shortly.
+    """
+
+    def __init__(self):
+        super().__init__("deadline", retry_after=5)
+
+
+class HedgePolicy:
+    """
+    Decides when a slow call gets a duplicate. Latencies of finished calls are kept per key
+    (tier and model) in a rolling window, and a hedge goes out once a call has been running
+    longer than their HEDGE_PERCENTILE. Every call earns HEDGE_BUDGET of a hedge credit and
+    every hedge spends one whole credit, so hedges stay under that share of traffic.
+    """
+
+    def __init__(self, enabled: bool = HEDGE_ENABLED, percentile: float = HEDGE_PERCENTILE,
+                 budget: float = HEDGE_BUDGET, min_delay: float = HEDGE_MIN_DELAY,
+                 min_samples: int = HEDGE_MIN_SAMPLES, window: int = HEDGE_WINDOW):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._credit = 0.0
+
+    def observe(self, key: str, seconds: float):
+        self._latencies.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def delay(self, key: Optional[str]) -> Optional[float]:
+        """
+        Seconds after which the call for `key` should be hedged, or None for no hedging.
+        Also credits the budget for this call.
+        """
+        if not self.enabled or key is None:
+            return None
+        self._credit = min(self._credit + self.budget, 1 + self.budget * 10)  # a small burst allowance
+        latencies = self._latencies.get(key)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, float(np.quantile(np.fromiter(latencies, float), self.percentile)))
+
+    def spend(self) -> bool:
+        if self._credit < 1:
+            return False
+        self._credit -= 1
+        return True
+
+
+class _Waiter:
+    __slots__ = ("user_id", "tokens", "future", "enqueued_at")
+
+    def __init__(self, user_id: str, tokens: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class ModelCallScheduler:
+    """
+    Admission control for outbound model calls: at most max_concurrency calls in flight,
+    a token bucket refilled at tokens_per_minute, and a bounded wait queue served
+    round-robin across users so one user's burst cannot starve everyone else.
+
+    A call that cannot be queued, or waits longer than queue_timeout, fails fast with
+    ModelBusyError instead of hanging the request.
+    """
+
+    def __init__(self, max_concurrency: int = MODEL_MAX_CONCURRENCY, tokens_per_minute: int = MODEL_TOKENS_PER_MINUTE,
+                 queue_max: int = MODEL_QUEUE_MAX, queue_timeout: float = MODEL_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout
+
+        self.active = 0
+        self.waiting = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()  # users in round-robin order
+
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._refill_timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.tokens_per_minute),
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60,
+        )
+        self._refilled_at = now
+
+    def _has_tokens(self, tokens: int) -> bool:
+        # A single call larger than the whole budget still runs once the bucket is full
+        return not self.tokens_per_minute or self._tokens >= min(tokens, self.tokens_per_minute)
+
+    def _dispatch(self):
+        self._refill()
+        while self.active < self.max_concurrency and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if not self._has_tokens(waiter.tokens):
+                self._schedule_refill(waiter.tokens)
+                return
+
+            self._pop_head(user_id, queue)
+            self._grant(waiter.tokens)
+            metrics.observe("model_queue_wait_ms", (time.perf_counter() - waiter.enqueued_at) * 1000)
+            waiter.future.set_result(None)
+
+    def _pop_head(self, user_id: str, queue: Deque[_Waiter]):
+        queue.popleft()
+        self.waiting -= 1
+        del self._queues[user_id]
+        if queue:
+            self._queues[user_id] = queue  # to the back of the rotation
+
+    def _grant(self, tokens: int):
+        self.active += 1
+        if self.tokens_per_minute:
+            self._tokens -= tokens
+
+    def _schedule_refill(self, tokens: int):
+        if self._refill_timer is not None:
+            return
+        missing = min(tokens, self.tokens_per_minute) - self._tokens
+        delay = max(missing * 60 / self.tokens_per_minute, 0.01)
+
+        def on_timer():
+            self._refill_timer = None
+            self._dispatch()
+
+        self._refill_timer = asyncio.get_running_loop().call_later(delay, on_timer)
+
+    def try_acquire(self, tokens: int) -> bool:
+        """
+        Takes a slot only if one is free right now, without queueing (used for hedges).
+        """
+        self._refill()
+        if self.active < self.max_concurrency and not self._queues and self._has_tokens(tokens):
+            self._grant(tokens)
+            return True
+        return False
+
+    async def acquire(self, user_id: str, tokens: int):
+        self._refill()
+        if self.active < self.max_concurrency and not self._queues and self._has_tokens(tokens):
+            self._grant(tokens)
+            metrics.observe("model_queue_wait_ms", 0.0)
+            return
+
+        if self.waiting >= self.queue_max:
+            metrics.increment("model_calls_rejected", reason="queue_full")
+            raise ModelBusyError("queue_full")
+
+        waiter = _Waiter(user_id, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self.waiting += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():  # granted at the last moment
+                return
+            self._discard(waiter)
+            metrics.increment("model_calls_rejected", reason="timeout")
+            raise ModelBusyError("queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self.release()  # the slot was granted to a request that went away
+            else:
+                self._discard(waiter)
+            raise
+
+    def _discard(self, waiter: _Waiter):
+        waiter.future.cancel()
+        queue = self._queues.get(waiter.user_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.waiting -= 1
+            if not queue:
+                del self._queues[waiter.user_id]
+        self._dispatch()  # it may have been the head waiting for tokens
+
+    def release(self, unused_tokens: int = 0):
+        self.active -= 1
+        if self.tokens_per_minute and unused_tokens > 0:
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + unused_tokens)
+        self._dispatch()
+
+    async def call(self, user_id: str, tokens: int, create: Callable[[], Awaitable], record=None,
+                   deadline: float = MODEL_DEADLINE_SECONDS):
+        """
+        Runs create() with retries inside one slot, all within `deadline` seconds. Unused reserved
+        tokens are handed back from the response's usage. `record` (a ModelCallRecord) gets the
+        start time and usage, and its tier and model select the latency history used for hedging.
+        """
+        try:
+            return await asyncio.wait_for(self._call(user_id, tokens, create, record), deadline)
+        except asyncio.TimeoutError:
+            metrics.increment("model_calls_rejected", reason="deadline")
+            raise ModelDeadlineError()
+
+    async def _call(self, user_id: str, tokens: int, create: Callable[[], Awaitable], record=None):
+        await self.acquire(user_id, tokens)
+        if record is not None:
+            record.started()
+        unused_tokens = 0
+        try:
+            key = f"{record.tier}:{record.model}" if record is not None else None
+            response = await self._hedged(create, tokens, key)
+            usage = getattr(response, "usage", None)
+            if record is not None:
+                record.add_usage(usage)
+            if usage is not None and usage.total_tokens:
+                unused_tokens = tokens - usage.total_tokens
+                metrics.observe("model_tokens", usage.total_tokens)
+            return response
+        finally:
+            self.release(unused_tokens)
+
+    async def _hedged(self, create: Callable[[], Awaitable], tokens: int, key: Optional[str]):
+        """
+        with_retry(create), plus one duplicate if it runs past the hedge delay while budget
+        and a free slot are available. The first successful response wins and the other
+        request is cancelled (its connection is closed, so generation stops).
+
+        The winner's usage is settled against the caller's reservation in _call, so the
+        hedge's own reservation is handed back in full whichever request wins. Only the
+        primary's latency is recorded: a hedge that wins would otherwise teach the policy
+        the hedged latency and shrink the delay.
+        """
+        started = time.perf_counter()
+        delay = hedge_policy.delay(key)
+        primary = asyncio.ensure_future(with_retry(create))
+        tasks = {primary}
+        hedge_slot = False
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                if not primary.done():
+                    if not hedge_policy.spend():
+                        metrics.increment("model_hedges", result="no_budget")
+                    elif not self.try_acquire(tokens):
+                        metrics.increment("model_hedges", result="no_capacity")
+                    else:
+                        hedge_slot = True
+                        tasks.add(asyncio.ensure_future(with_retry(create)))
+                        metrics.increment("model_hedges", result="sent")
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedge_slot:
+                            metrics.increment("model_hedges", result="won" if task is not primary else "lost")
+                        if key is not None and task is primary:
+                            hedge_policy.observe(key, time.perf_counter() - started)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hedge_slot:
+                self.release(tokens)
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.APIConnectionError, openai.RateLimitError)):  # includes timeouts
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def with_retry(create: Callable[[], Awaitable], attempts: int = MODEL_RETRY_ATTEMPTS):
+    """
+    Retries 429, 5xx, connection errors and timeouts with exponential backoff and full jitter,
+    honouring the provider's Retry-After. Rate limiting that outlasts the retries is
+    reported as ModelBusyError rather than a server error.
+    """
+    for attempt in range(attempts + 1):
+        try:
+            return await create()
+        except Exception as e:
+            if not _is_retryable(e):
+                raise
+            status = getattr(e, "status_code", None) or type(e).__name__
+            if attempt == attempts:
+                metrics.increment("model_call_failures", status=status)
+                if isinstance(e, openai.RateLimitError):
+                    raise ModelBusyError("rate_limited") from e
+                raise
+            metrics.increment("model_call_retries", status=status)
+            delay = random.uniform(0, min(MODEL_RETRY_MAX_DELAY, MODEL_RETRY_BASE_DELAY * 2 ** attempt))
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, MODEL_RETRY_MAX_DELAY))
+            await asyncio.sleep(delay)
+
+
+async def open_stream(create: Callable[[], Awaitable], deadline: float = MODEL_DEADLINE_SECONDS):
+    """
+    with_retry(create) for a streamed completion, bounded by `deadline` until the stream is open.
+    Streams are not hedged: the student already sees the answer arriving.
+    """
+    try:
+        return await asyncio.wait_for(with_retry(create), deadline)
+    except asyncio.TimeoutError:
+        metrics.increment("model_calls_rejected", reason="deadline")
+        raise ModelDeadlineError()
+
+
+def image_tokens(width: int, height: int) -> int:
+    """
+    Prompt tokens of a high-detail image: 85 + 170 per 512px tile after fitting 2048
+    and scaling the short side to 768.
+    """
+    scale = min(1.0, 2048 / max(width, height, 1))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / max(min(width, height), 1))
+    width, height = width * scale, height * scale
+    tiles = -(-int(width) // 512) * -(-int(height) // 512)
+    return 85 + 170 * tiles
+
+
+def estimate_tokens(width: int, height: int, max_tokens: int, prompt_tokens: int = 600) -> int:
+    """
+    Upper bound used to reserve budget before a vision call: the image tiles,
+    the text prompt and the full completion allowance.
+    """
+    return image_tokens(width, height) + prompt_tokens + max_tokens
+
+
+model_scheduler = ModelCallScheduler()
+hedge_policy = HedgePolicy()
+
+metrics.register_gauge("model_queue_depth", lambda: model_scheduler.waiting)
+metrics.register_gauge("model_active_calls", lambda: model_scheduler.active)
@@ -0,0 +1,255 @@
+import asyncio
+import datetime
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlmodel import Session
+
+from database.database import engine
+from database.models import crud
+from database.models.model_call import ModelCall
+from database.read_models.read_models import ModelCallStatsDTO
+from service import metrics
+from service.questions.config import TELEMETRY_ENABLED, TELEMETRY_FLUSH_INTERVAL, TELEMETRY_MAX_BUFFER, MODEL_PRICES
+from service.questions.model_scheduler import ModelBusyError, ModelDeadlineError
+
+
+def _elapsed_ms(start: Optional[float], end: Optional[float]) -> Optional[int]:
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000)
+
+
+class ModelCallRecord:
+    """
+    Timing and usage of one model call, from the moment it asks for a scheduler slot.
+    The scheduler marks started(), streaming callers mark first_token(), and finish()
+    hands the row to the recorder. Used as a context manager, an exception that escapes
+    the block sets the outcome (timeout past the deadline, busy for other ModelBusyErrors,
+    cancelled when the request went away).
+    """
+    __slots__ = ("user_id", "subject", "tier", "model", "image_tokens", "outcome", "created_at",
+                 "enqueued_at", "started_at", "first_token_at", "prompt_tokens", "completion_tokens", "finished")
+
+    def __init__(self, user_id: Optional[str], subject: Optional[str], tier: str, model: str, image_tokens: int = 0):
+        self.user_id = user_id
+        self.subject = subject
+        self.tier = tier
+        self.model = model
+        self.image_tokens = image_tokens
+        self.outcome = "answered"
+        self.created_at = datetime.datetime.now()
+        self.enqueued_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.finished = False
+
+    def started(self):
+        self.started_at = time.perf_counter()
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def add_usage(self, usage):
+        if usage is None:
+            return
+        self.prompt_tokens = (self.prompt_tokens or 0) + (usage.prompt_tokens or 0)
+        self.completion_tokens = (self.completion_tokens or 0) + (usage.completion_tokens or 0)
+
+    def finish(self, outcome: Optional[str] = None):
+        if self.finished:
+            return
+        self.finished = True
+        if outcome is not None:
+            self.outcome = outcome
+
+        now = time.perf_counter()
+        latency_ms = _elapsed_ms(self.started_at, now)
+        if latency_ms is not None:
+            metrics.observe("model_call_ms", latency_ms, tier=self.tier, model=self.model)
+        if self.prompt_tokens is not None:
+            metrics.increment("model_prompt_tokens", self.prompt_tokens, tier=self.tier, model=self.model)
+            metrics.increment("model_completion_tokens", self.completion_tokens, tier=self.tier, model=self.model)
+
+        model_call_recorder.add(ModelCall(
+            created_at=self.created_at,
+            user_id=self.user_id,
+            subject=self.subject,
+            tier=self.tier,
+            model=self.model,
+            outcome=self.outcome,
+            queue_wait_ms=_elapsed_ms(self.enqueued_at, self.started_at or now),
+            ttft_ms=_elapsed_ms(self.started_at, self.first_token_at),
+            latency_ms=latency_ms,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            image_tokens=self.image_tokens or None,
+        ))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        elif issubclass(exc_type, ModelDeadlineError):
+            self.finish("timeout")
+        elif issubclass(exc_type, ModelBusyError):
+            self.finish("busy")
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            self.finish("cancelled")
+        else:
+            self.finish("error")
+        return False
+
+
+class ModelCallRecorder:
+    """
+    Buffers finished ModelCall rows and appends them to model_calls every
+    TELEMETRY_FLUSH_INTERVAL seconds with one multi-row INSERT on a worker thread.
+    Telemetry is allowed to lose rows: past TELEMETRY_MAX_BUFFER the oldest are dropped,
+    and a failed flush is counted and not retried.
+    """
+
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED, flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+                 max_buffer: int = TELEMETRY_MAX_BUFFER):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[ModelCall] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, row: ModelCall):
+        if not self.enabled:
+            return
+        self._buffer.append(row)
+        if len(self._buffer) > self.max_buffer:
+            del self._buffer[0]
+            metrics.increment("model_telemetry_rows", result="dropped")
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(crud.insert_many, rows)
+            metrics.increment("model_telemetry_rows", len(rows), result="written")
+        except Exception as e:
+            print(f"Failed to write model telemetry: {e}")
+            metrics.increment("model_telemetry_rows", len(rows), result="failed")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+model_call_recorder = ModelCallRecorder()
+
+
+def track(user_id: Optional[str], subject: Optional[str], tier: str, model: str, image_tokens: int = 0) -> ModelCallRecord:
+    return ModelCallRecord(user_id, subject, tier, model, image_tokens)
+
+
+stats_keys = {
+    "day": "to_char(date_trunc('day', created_at), 'YYYY-MM-DD')",
+    "subject": "coalesce(subject, '')",
+    "user": "coalesce(user_id, '')",
+    "tier": "tier",
+}
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return 0.0
+    return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+
+
+def get_model_call_stats(group_by: str, days: int = 30, limit: Optional[int] = None) -> List[ModelCallStatsDTO]:
+    """
+    model_calls aggregated per (group_by, model) over the last `days` days. With a limit,
+    only the keys with the most tokens are returned (for the per-user view).
+    """
+    key = stats_keys.get(group_by)
+    if key is None:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(stats_keys)}")
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 366")
+
+    top_keys = ""
+    if limit is not None:
+        top_keys = f"""
+            AND {key} IN (
+                SELECT {key} FROM model_calls WHERE created_at >= :since
+                GROUP BY 1 ORDER BY sum(coalesce(prompt_tokens, 0) + coalesce(completion_tokens, 0)) DESC
+                LIMIT :limit
+            )
+        """
+
+    query = f"""
+        SELECT
+            {key} AS key,
+            model,
+            count(*) AS calls,
+            count(*) FILTER (WHERE outcome = 'error') AS errors,
+            count(*) FILTER (WHERE outcome = 'unclear') AS unclear,
+            count(*) FILTER (WHERE outcome = 'busy') AS busy,
+            count(*) FILTER (WHERE outcome = 'timeout') AS timeouts,
+            avg(queue_wait_ms) AS avg_queue_wait_ms,
+            avg(ttft_ms) AS avg_ttft_ms,
+            avg(latency_ms) AS avg_latency_ms,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms) AS p50_latency_ms,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_latency_ms,
+            coalesce(sum(prompt_tokens), 0) AS prompt_tokens,
+            coalesce(sum(completion_tokens), 0) AS completion_tokens,
+            coalesce(sum(image_tokens), 0) AS image_tokens
+        FROM model_calls
+        WHERE created_at >= :since {top_keys}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+    since = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=days - 1), datetime.time())
+
+    with Session(engine) as session:
+        rows = session.execute(text(query), {"since": since, "limit": limit}).all()
+
+    return [
+        ModelCallStatsDTO(
+            key=row.key,
+            model=row.model,
+            calls=row.calls,
+            errors=row.errors,
+            unclear=row.unclear,
+            busy=row.busy,
+            timeouts=row.timeouts,
+            avg_queue_wait_ms=_rounded(row.avg_queue_wait_ms),
+            avg_ttft_ms=_rounded(row.avg_ttft_ms),
+            avg_latency_ms=_rounded(row.avg_latency_ms),
+            p50_latency_ms=_rounded(row.p50_latency_ms),
+            p95_latency_ms=_rounded(row.p95_latency_ms),
+            prompt_tokens=row.prompt_tokens,
+            completion_tokens=row.completion_tokens,
+            image_tokens=row.image_tokens,
+            cost_usd=round(call_cost(row.model, row.prompt_tokens, row.completion_tokens), 4),
+        ) for row in rows
+    ]
+
+
+def _rounded(value) -> Optional[float]:
+    return None if value is None else round(float(value), 1)
@@ -0,0 +1,49 @@
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from secret.secret import api_key
+from service.questions.config import OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS, \
+    OPENAI_KEEPALIVE_EXPIRY, OPENAI_CONNECT_TIMEOUT, OPENAI_READ_TIMEOUT, OPENAI_MAX_RETRIES, \
+    OPENAI_BASE_URL
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def init_openai_client() -> AsyncOpenAI:
+    """
+    Creates the application-wide async client. Called once at startup so every request
+    reuses the same keep-alive connection pool instead of a new TLS handshake per call.
+    """
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                OPENAI_READ_TIMEOUT,
+                connect=OPENAI_CONNECT_TIMEOUT,
+            ),
+        )
+        _client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=OPENAI_BASE_URL,
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+
+def get_openai_client() -> AsyncOpenAI:
+    return _client if _client is not None else init_openai_client()
+
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
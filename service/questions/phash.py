@@ -0,0 +1,107 @@
+from functools import lru_cache
+from itertools import combinations
+from io import BytesIO
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image, ImageOps
+
+hash_size = 8
+image_size = 32  # the DCT runs on a 32x32 grayscale copy, the hash keeps its 8x8 low frequencies
+
+
+@lru_cache(maxsize=1)
+def _dct_matrix() -> np.ndarray:
+    # Orthonormal DCT-II basis, so a 2D DCT is two matrix products
+    n = np.arange(image_size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * image_size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / image_size)
+
+
+def compute_phash(contents: bytes) -> int:
+    """
+    64-bit DCT perceptual hash of an image. Photos of the same page taken a little apart
+    (scale, JPEG quality, lighting) land a few bits apart, unrelated pages about 32 apart.
+    Returned as a signed 64-bit int so it fits a BIGINT column.
+    """
+    image = Image.open(BytesIO(contents))
+    image.draft("L", (image_size * 4, image_size * 4))
+    image = ImageOps.exif_transpose(image).convert("L").resize((image_size, image_size), Image.LANCZOS)
+
+    pixels = np.asarray(image, dtype=np.float64)
+    dct = _dct_matrix()
+    low_frequencies = (dct @ pixels @ dct.T)[:hash_size, :hash_size].flatten()
+
+    # The DC term only carries overall brightness, leave it out of the median
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes: each hash is filed under its four 16-bit
+    chunks. Two hashes within r bits agree within r // 4 bits on at least one chunk,
+    so a lookup probes every chunk value that close and only compares full hashes
+    for those candidates, instead of walking the whole set.
+    """
+
+    __slots__ = ("_values", "_tables")
+
+    chunks = 4
+    chunk_bits = 16
+
+    def __init__(self):
+        self._values: Dict[int, object] = {}
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self.chunks)]
+
+    def __len__(self):
+        return len(self._values)
+
+    @classmethod
+    def _chunks_of(cls, hash_value: int):
+        unsigned = hash_value & 0xFFFFFFFFFFFFFFFF
+        mask = (1 << cls.chunk_bits) - 1
+        return [(unsigned >> (cls.chunk_bits * i)) & mask for i in range(cls.chunks)]
+
+    def add(self, hash_value: int, value):
+        if hash_value not in self._values:
+            for table, chunk in zip(self._tables, self._chunks_of(hash_value)):
+                table.setdefault(chunk, []).append(hash_value)
+        self._values[hash_value] = value  # same hash: keep the newest answer
+
+    def nearest(self, hash_value: int, max_distance: int):
+        """
+        (distance, value) of the closest hash within max_distance, or None.
+        """
+        if hash_value in self._values:
+            return 0, self._values[hash_value]
+
+        chunk_radius = max_distance // self.chunks
+        best = None
+        seen = set()
+        for table, chunk in zip(self._tables, self._chunks_of(hash_value)):
+            for probe in _flip_bits(chunk, self.chunk_bits, chunk_radius):
+                for candidate in table.get(probe, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming_distance(hash_value, candidate)
+                    if distance <= max_distance and (best is None or distance < best[0]):
+                        best = (distance, self._values[candidate])
+        return best
+
+
+def _flip_bits(value: int, bits: int, radius: int):
+    yield value
+    for count in range(1, radius + 1):
+        for positions in combinations(range(bits), count):
+            flipped = value
+            for position in positions:
+                flipped ^= 1 << position
+            yield flipped
@@ -0,0 +1,116 @@
+import time
+from dataclasses import dataclass, replace
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from service import metrics
+from service.questions.config import QUALITY_GATE_ENABLED, QUALITY_GATE_DIMENSION, QUALITY_MIN_SHARPNESS, \
+    QUALITY_MIN_BRIGHTNESS, QUALITY_MAX_BRIGHTNESS, QUALITY_MAX_CLIPPED, QUALITY_MIN_TEXT_CONTRAST, \
+    QUALITY_GATE_THRESHOLDS
+
+tile_size = 16  # text contrast is estimated per 16x16 tile of the downscaled copy
+
+
+@dataclass(slots=True, frozen=True)
+class QualityThresholds:
+    enabled: bool = QUALITY_GATE_ENABLED
+    min_sharpness: float = QUALITY_MIN_SHARPNESS
+    min_brightness: float = QUALITY_MIN_BRIGHTNESS
+    max_brightness: float = QUALITY_MAX_BRIGHTNESS
+    max_clipped: float = QUALITY_MAX_CLIPPED
+    min_text_contrast: float = QUALITY_MIN_TEXT_CONTRAST
+
+
+_default_thresholds = QualityThresholds()
+_thresholds = {
+    subject: replace(_default_thresholds, **overrides) for subject, overrides in QUALITY_GATE_THRESHOLDS.items()
+}
+
+
+def get_thresholds(subject: str) -> QualityThresholds:
+    return _thresholds.get(subject, _default_thresholds)
+
+
+@dataclass(slots=True)
+class QualityReport:
+    sharpness: float
+    brightness: float
+    clipped: float
+    text_contrast: float
+    elapsed_ms: float
+
+
+def assess_quality(contents: bytes) -> QualityReport:
+    """
+    Blur and exposure statistics of a QUALITY_GATE_DIMENSION grayscale copy of the photo.
+    JPEG draft mode decodes straight at a reduced scale, and everything after the resize is
+    a handful of whole-array NumPy operations, so this takes a few milliseconds.
+    """
+    started = time.perf_counter()
+
+    image = Image.open(BytesIO(contents))
+    image.draft("L", (QUALITY_GATE_DIMENSION, QUALITY_GATE_DIMENSION))
+    image = ImageOps.exif_transpose(image).convert("L")
+    image.thumbnail((QUALITY_GATE_DIMENSION, QUALITY_GATE_DIMENSION), Image.BILINEAR)
+    pixels = np.asarray(image, dtype=np.float32)
+
+    # Variance of the 4-neighbour Laplacian: strokes of a sharp photo give large second derivatives
+    laplacian = (
+        pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+        - 4 * pixels[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var())
+
+    histogram = np.bincount(pixels.astype(np.uint8).ravel(), minlength=256)
+    brightness = float(np.dot(histogram, np.arange(256)) / pixels.size)
+    clipped = float((histogram[:6].sum() + histogram[250:].sum()) / pixels.size)
+
+    # Ink on paper: the most textured tenth of the tiles should show a clear spread of gray levels
+    rows, columns = pixels.shape[0] // tile_size, pixels.shape[1] // tile_size
+    if rows and columns:
+        tiles = pixels[:rows * tile_size, :columns * tile_size].reshape(rows, tile_size, columns, tile_size)
+        tile_std = np.sort(tiles.std(axis=(1, 3)).ravel())
+        text_contrast = float(tile_std[-max(1, tile_std.size // 10):].mean())
+    else:
+        text_contrast = float(pixels.std())
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("quality_gate_ms", elapsed_ms)
+    return QualityReport(sharpness, brightness, clipped, text_contrast, elapsed_ms)
+
+
+def rejection_reason(subject: str, report: Optional[QualityReport]) -> Optional[str]:
+    """
+    Why the photo should not be sent to the model, or None. Rejections are counted per
+    reason and subject. A missing report (the check itself failed) lets the photo through.
+
+    Only blur or faint text rejects a photo. Exposure alone does not: a clean screenshot or
+    scan is mostly white paper, so it is bright and mostly clipped and still perfectly
+    legible. When the text is unreadable, bad exposure is reported as the cause.
+    """
+    thresholds = get_thresholds(subject)
+    if report is None or not thresholds.enabled:
+        return None
+
+    blurry = report.sharpness < thresholds.min_sharpness
+    low_contrast = report.text_contrast < thresholds.min_text_contrast
+    if not (blurry or low_contrast):
+        metrics.increment("quality_gate", result="passed", subject=subject)
+        return None
+
+    if report.brightness < thresholds.min_brightness:
+        reason = "dark"
+    elif report.brightness > thresholds.max_brightness:
+        reason = "overexposed"
+    elif report.clipped > thresholds.max_clipped:
+        reason = "clipped"
+    elif blurry:
+        reason = "blurry"
+    else:
+        reason = "low_contrast"
+
+    metrics.increment("quality_gate", result=reason, subject=subject)
+    return reason
@@ -1,29 +1,46 @@
 import asyncio
 import base64
 import datetime
-import io
-import json
+import hashlib
+import re
 import time
 import uuid
-from io import BytesIO
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import quote
 
-import requests
-from PIL import Image
-from fastapi import Request, UploadFile, File
-from openai import OpenAI
+from fastapi import Request, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy import text
 from sqlmodel import Session
-from fastapi.responses import JSONResponse
 
-from service.questions.util import get_question_with_image, init_system_config
+from service.questions.util import get_question_with_image, init_system_config, init_followup_config, \
+    get_followup_question
 from database.database import engine
-from database.models import crud
-from database.models.user_question import UserQuestion
+from database.models.user_question import UserQuestion, month_start
 from database.models.user import User
-from secret.secret import api_key
-
-user_threads: Dict[str, List[Dict[str, str]]] = {}
+from database.read_models.read_models import UserQuestionHistoryDTO
+from service.responses import FastJSONResponse, dumps
+from service.questions.openai_client import get_openai_client
+from service.questions.image_processing import prepare_model_image, make_thumbnail, run_in_image_pool
+from service.questions.phash import compute_phash
+from service.questions.answer_cache import answer_cache
+from service.questions.config import ANSWER_CACHE_ENABLED, BATCH_MAX_FILES, BATCH_MAX_CONCURRENCY, \
+    FOLLOWUP_MODEL, FOLLOWUP_MAX_TOKENS, FOLLOWUP_CONTEXT_LINES, FOLLOWUP_FULL_ANSWER_TOKENS
+from service.questions.conversation_store import count_tokens
+from service.questions.triage import get_route, triage_image
+from service.questions.model_telemetry import track
+from service.questions.quality_gate import assess_quality, rejection_reason
+from service.questions.answer_writer import answer_writer
+from database.pydantic_models.pydantic_models import FollowupRequest
+from service.questions.idempotency import idempotency_store, derive_idempotency_key
+from service.questions.model_scheduler import model_scheduler, open_stream, estimate_tokens, image_tokens, \
+    ModelBusyError, ModelDeadlineError, busy_message
+from service import metrics
+
+unclear_image_message = "이미지가 또렷하지 않은 것 같아요. 다시 한 번 찍어서 업로드 해주세요!"
+server_error_message = "서버 오류. 사진을 다시 찍어주세요."
+unreadable_image_detail = "The uploaded file is not a readable image"
 
 
 async def get_users(user_id, subject):
@@ -35,113 +52,733 @@ async def get_users(user_id, subject):
         return users
 
 
+async def process_upload(contents: bytes):
+    """
+    Thumbnail, model image and the quality report are produced in parallel on the image pool,
+    off the event loop. The perceptual hash is taken from the thumbnail, the same input the
+    cache was built from.
+    """
+    thumbnail, model_image, quality = await asyncio.gather(
+        run_in_image_pool(make_thumbnail, contents),
+        run_in_image_pool(prepare_model_image, contents),
+        run_in_image_pool(assess_quality, contents),
+    )
+    try:
+        phash = await run_in_image_pool(compute_phash, thumbnail.data)
+    except Exception as e:
+        print(e)
+        phash = None
+
+    return thumbnail, model_image, phash, quality
+
+
+async def get_cached_answer(subject: str, phash, use_cache: bool):
+    if not (use_cache and ANSWER_CACHE_ENABLED):
+        metrics.increment("answer_cache_lookups", result="bypass")
+        return None
+    # A hit reads the stored answer from the database, off the event loop
+    return await asyncio.to_thread(answer_cache.get_answer, subject, phash)
+
+
+async def save_answer(question_id, user_id, subject, answer, contents, thumbnail, model_image, phash, created_at):
+    user_question = build_user_question(
+        question_id, user_id, subject, answer, contents, thumbnail, model_image, phash, created_at
+    )
+    await answer_writer.submit([user_question])
+
+
+def build_user_question(question_id, user_id, subject, answer, contents, thumbnail, model_image, phash,
+                        created_at):
+    # Images are stored as raw bytes; base64 is only ever produced for the model payload
+    return UserQuestion(
+        id=question_id,
+        user_id=user_id,
+        subject=subject,
+        answer=answer,
+        image=contents,
+        image_content_type=model_image.original_mime_type,
+        image_small=thumbnail.data,
+        image_small_content_type=thumbnail.mime_type,
+        image_small_md5=hashlib.md5(thumbnail.data).hexdigest(),
+        phash=phash,
+        created_at=created_at
+    )
+
+
 async def answer_question(
         req: Request,
         file: UploadFile = File(...),
         subject: str = 'math',
         user_id: str = "unknown",
+        use_cache: bool = True,
+        idempotency_key: Optional[str] = None,
 ):
 
     contents: bytes = await file.read()
-    image = Image.open(BytesIO(contents))
 
-    i = image.size  # current size (height,width)
-    i = i[0] // 4, i[1] // 4  # new size
-    downsized_image = image.resize(i)
-
-    img_byte_arr = io.BytesIO()
-    downsized_image.save(img_byte_arr, format='PNG')
-    downsized_image_bytes = img_byte_arr.getvalue()
+    # Retries of the same upload share one model call and one history row.
+    # Server errors are not stored, so a retry after one really retries.
+    return await idempotency_store.run(
+        derive_idempotency_key("ask", user_id, subject, contents, idempotency_key),
+        lambda: answer_upload(contents, subject, user_id, use_cache),
+        store_if=lambda answer: answer != server_error_message,
+    )
 
-    encoded_image = base64.b64encode(contents).decode('utf-8')  # Encode as base64 string
-    encoded_image_downsized = base64.b64encode(downsized_image_bytes).decode('utf-8')
 
+async def answer_upload(contents: bytes, subject: str, user_id: str, use_cache: bool):
+    result = await solve_upload(contents, subject, user_id, use_cache)
+    if result.user_question is not None:
+        # Written behind the response by answer_writer, the student does not wait for the INSERT
+        await answer_writer.submit([result.user_question])
+    return result.text
+
+
+@dataclass(slots=True)
+class UploadAnswer:
+    status: str  # answered, unclear, busy or error
+    text: str
+    user_question: Optional[UserQuestion] = None  # the row to persist, for answered uploads
+
+
+async def solve_upload(contents: bytes, subject: str, user_id: str, use_cache: bool, prepared=None) -> UploadAnswer:
+    """
+    Answers one upload without writing anything, so callers can persist the rows
+    one at a time or all at once. `prepared` is the result of process_upload when the
+    caller already has it. ModelBusyError is left to the caller, and an upload that is
+    not a readable image is answered with 400.
+    """
+    # The model gets a downscaled copy, the original is still archived in UserQuestion.image
+    if prepared is None:
+        try:
+            prepared = await process_upload(contents)
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=400, detail=unreadable_image_detail)
+    thumbnail, model_image, phash, quality = prepared
     create_at = datetime.datetime.now()
 
-    try:
+    # A near-identical photo was answered before: reuse that answer instead of calling the model
+    cached_answer = await get_cached_answer(subject, phash, use_cache)
+    if cached_answer is not None:
+        return UploadAnswer("answered", cached_answer, build_user_question(
+            f"{user_id}_{str(uuid.uuid4())}", user_id, subject, cached_answer,
+            contents, thumbnail, model_image, phash, create_at
+        ))
+
+    # Blurry or badly exposed photos are turned away locally, without any model call
+    if rejection_reason(subject, quality):
+        return UploadAnswer("unclear", unclear_image_message)
+
+    # Unreadable photos stop at the cheap triage model and never reach the solver
+    route = get_route(subject)
+    triage = await triage_image(user_id, subject, data_url(thumbnail.data, thumbnail.mime_type), route)
+    if not triage.clear:
+        return UploadAnswer("unclear", unclear_image_message)
+
+    encoded_model_image = base64.b64encode(model_image.data).decode('utf-8')
+
+    with track(user_id, subject, "solve", route.solver_model,
+               image_tokens=image_tokens(model_image.width, model_image.height)) as record:
+        try:
+
+            question_prompt = get_question_with_image(encoded_model_image, subject, model_image.mime_type)
+
+            response = await model_scheduler.call(
+                user_id,
+                estimate_tokens(model_image.width, model_image.height, route.solver_max_tokens),
+                lambda: get_openai_client().chat.completions.create(
+                    messages=[init_system_config(subject), question_prompt],
+                    model=route.solver_model,
+                    max_tokens=route.solver_max_tokens
+                ),
+                record,
+            )
 
-        base64_image = base64.b64encode(contents).decode('utf-8')
+            return_value = response.choices[0].message.content
 
-        client = OpenAI(api_key=api_key)
+            if return_value.startswith("1"):
+                return_value = return_value[3:]
+                return UploadAnswer("answered", return_value, build_user_question(
+                    f"{user_id}_{str(uuid.uuid4())}", user_id, subject, return_value,
+                    contents, thumbnail, model_image, phash, create_at
+                ))
+            else:
+                record.outcome = "unclear"
+                return UploadAnswer("unclear", unclear_image_message)
 
-        question_prompt = get_question_with_image(base64_image, subject)
+        except ModelBusyError:
+            raise  # answered with 503 + Retry-After by the app's exception handler
+        except Exception as e:
+            print(e)
+            record.outcome = "error"
+            return UploadAnswer("error", server_error_message)
 
-        response = json.loads(client.chat.completions.create(
-            messages=[init_system_config(subject), question_prompt],
-            model="gpt-4o",
-            max_tokens=3000
-        ).model_dump_json())
 
-        return_value = response['choices'][0]['message']['content']
+def data_url(data: bytes, mime_type: str) -> str:
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
 
-        if return_value.startswith("1"):
-            return_value = return_value[3:]
 
-            await crud.create(
-                UserQuestion(
-                    id=f"{user_id}_{str(uuid.uuid4())}",
-                    user_id=user_id,
-                    subject=subject,
-                    answer=return_value,
-                    image=encoded_image,
-                    image_small=encoded_image_downsized,
-                    created_at=create_at
-                )
-            )
-            print(return_value)
-            return return_value
-        else:
-            return "이미지가 또렷하지 않은 것 같아요. 다시 한 번 찍어서 업로드 해주세요!"
+def sse_event(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
 
+async def answer_question_stream(
+        req: Request,
+        file: UploadFile = File(...),
+        subject: str = 'math',
+        user_id: str = "unknown",
+        use_cache: bool = True,
+        idempotency_key: Optional[str] = None,
+):
+    """
+    Same as answer_question, but forwards the model's tokens as server-sent events:
+    token* then done, or a single unclear / busy / error event. The "1" clarity prefix is
+    checked on the first tokens and the UserQuestion row is written once the stream completes.
+    An upload that is not a readable image gets an error event with the plain /ask's 400 detail.
+
+    A duplicate of an in-flight or recently finished upload gets the whole answer
+    as a single token event followed by the original done / unclear event.
+    """
+    contents: bytes = await file.read()
+    key = derive_idempotency_key("stream", user_id, subject, contents, idempotency_key)
+
+    async def event_stream():
+        found, replay = idempotency_store.completed(key)
+        if not found:
+            future = idempotency_store.in_flight(key)
+            if future is not None:
+                try:
+                    replay = await asyncio.shield(future)
+                except Exception:
+                    yield sse_event("error", {"text": server_error_message})
+                    return
+        if replay is not None:
+            for event, data in replay:
+                yield sse_event(event, data)
+            return
+
+        idempotency_store.begin(key)
+        answer_parts = []
+        final_events = None
+        try:
+            async for event, data in answer_upload_events(contents, subject, user_id, use_cache):
+                if event == "token":
+                    answer_parts.append(data["text"])
+                elif event == "done":
+                    final_events = [("token", {"text": "".join(answer_parts)}), (event, data)]
+                elif event == "unclear":
+                    final_events = [(event, data)]
+                yield sse_event(event, data)
+        finally:
+            # Errors and client disconnects are not stored: waiting duplicates get an error, retries run again
+            if final_events is not None:
+                idempotency_store.finish(key, final_events)
+            else:
+                idempotency_store.abort(key)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def answer_upload_events(contents: bytes, subject: str, user_id: str, use_cache: bool):
+    """
+    (event, data) pairs for answer_question_stream.
+    """
+    # The model gets a downscaled copy, the original is still archived in UserQuestion.image
+    try:
+        thumbnail, model_image, phash, quality = await process_upload(contents)
     except Exception as e:
         print(e)
-        return "서버 오류. 사진을 다시 찍어주세요."
+        # Same as the 400 of the plain /ask: the upload itself is broken, a retake will not help
+        yield "error", {"text": unreadable_image_detail}
+        return
+    create_at = datetime.datetime.now()
 
+    cached_answer = await get_cached_answer(subject, phash, use_cache)
+    if cached_answer is not None:
+        question_id = f"{user_id}_{str(uuid.uuid4())}"
+        await save_answer(
+            question_id, user_id, subject, cached_answer,
+            contents, thumbnail, model_image, phash, create_at
+        )
+        yield "token", {"text": cached_answer}
+        yield "done", {"id": question_id}
+        return
+
+    # Blurry or badly exposed photos are turned away locally, without any model call
+    if rejection_reason(subject, quality):
+        yield "unclear", {"text": unclear_image_message}
+        return
+
+    # Unreadable photos stop at the cheap triage model and never reach the solver
+    route = get_route(subject)
+    try:
+        triage = await triage_image(user_id, subject, data_url(thumbnail.data, thumbnail.mime_type), route)
+    except ModelBusyError as e:
+        yield "busy", {"text": busy_message, "retryAfter": e.retry_after}
+        return
+    if not triage.clear:
+        yield "unclear", {"text": unclear_image_message}
+        return
+
+    encoded_model_image = base64.b64encode(model_image.data).decode('utf-8')
 
-async def get_questions(user_id, subject, start, end):
+    record = track(user_id, subject, "solve", route.solver_model,
+                   image_tokens=image_tokens(model_image.width, model_image.height))
+    record.outcome = "cancelled"  # unless the stream reaches an outcome before the client goes away
 
-    subject_list = ["수학", "과학"]
+    # The slot is held until the whole answer has been streamed
+    try:
+        await model_scheduler.acquire(
+            user_id, estimate_tokens(model_image.width, model_image.height, route.solver_max_tokens)
+        )
+    except ModelBusyError as e:
+        record.finish("busy")
+        yield "busy", {"text": busy_message, "retryAfter": e.retry_after}
+        return
+    record.started()
+
+    head = ""  # first characters, held back until the clarity prefix can be checked
+    answer_parts = []
+    try:
+        try:
+            stream = await open_stream(lambda: get_openai_client().chat.completions.create(
+                messages=[
+                    init_system_config(subject),
+                    get_question_with_image(encoded_model_image, subject, model_image.mime_type)
+                ],
+                model=route.solver_model,
+                max_tokens=route.solver_max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+            ))
+        except ModelBusyError as e:
+            record.outcome = "timeout" if isinstance(e, ModelDeadlineError) else "busy"
+            yield "busy", {"text": busy_message, "retryAfter": e.retry_after}
+            return
+        except Exception as e:
+            print(e)
+            record.outcome = "error"
+            yield "error", {"text": server_error_message}
+            return
+
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record.add_usage(chunk.usage)  # the last chunk, without choices
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                record.first_token()
+
+                if answer_parts:
+                    answer_parts.append(delta)
+                    yield "token", {"text": delta}
+                    continue
+
+                head += delta
+                if len(head) < 3:
+                    continue
+                if not head.startswith("1"):
+                    # Unclear image: stop generating instead of paying for the rest of the answer
+                    await stream.close()
+                    record.outcome = "unclear"
+                    yield "unclear", {"text": unclear_image_message}
+                    return
+
+                answer_parts.append(head[3:])
+                if head[3:]:
+                    yield "token", {"text": head[3:]}
+            record.outcome = "answered" if answer_parts else "unclear"
+        except Exception as e:
+            print(e)
+            record.outcome = "error"
+            yield "error", {"text": server_error_message}
+            return
+    finally:
+        # Hand back the part of the completion allowance that was not generated (about a token per character)
+        model_scheduler.release(max(0, route.solver_max_tokens - sum(len(part) for part in answer_parts)))
+        record.finish()
+
+    if not answer_parts:
+        yield "unclear", {"text": unclear_image_message}
+        return
+
+    question_id = f"{user_id}_{str(uuid.uuid4())}"
+    await save_answer(
+        question_id, user_id, subject, "".join(answer_parts),
+        contents, thumbnail, model_image, phash, create_at
+    )
+    yield "done", {"id": question_id}
+
+
+def thumbnail_url(question_id: str) -> str:
+    return f"/ask/thumbnail/{quote(question_id, safe='')}"
+
+
+history_subjects = {"수학": "math", "과학": "science"}
+history_default_limit = 30
+history_max_limit = 100
+history_recent_months = 3  # monthly partitions a history page is read from first
+
+
+async def get_questions(user_id, subject, start=None, end=None, limit=history_default_limit, before=None):
+    """
+    Newest first, one page at a time. `before` is the id of the last item of the previous page;
+    X-Next-Cursor carries it for the next call and is absent on the last page.
+    Only the returned columns are read and images are referenced by URL, so a repeat load
+    moves just the JSON and the client's HTTP cache serves the thumbnails.
+
+    The page is first read from the last history_recent_months monthly partitions only;
+    older partitions are scanned just for the rows still missing when those run out.
+    """
+    if not 1 <= limit <= history_max_limit:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {history_max_limit}")
+
+    res = await asyncio.to_thread(_load_history, user_id, subject, start, end, limit, before)
+
+    headers = {"X-Next-Cursor": res[-1].id} if len(res) == limit else None
+    return FastJSONResponse(content=res, headers=headers)
+
+
+def _load_history(user_id, subject, start, end, limit, before) -> List[UserQuestionHistoryDTO]:
+    conditions = ["user_id = :user_id"]
+    params = {"user_id": user_id, "limit": limit}
+
+    if subject in history_subjects:
+        conditions.append("subject = :subject")
+        params["subject"] = history_subjects[subject]
+    if start is not None:
+        conditions.append("created_at >= :start")
+        params["start"] = start
+    if end is not None:
+        conditions.append("created_at <= :end")
+        params["end"] = end
+    if before is not None:
+        # Row comparison on (created_at, id) matches the index order, so each page is one index range scan
+        conditions.append(
+            "(created_at, id) < (SELECT created_at, id FROM user_questions WHERE id = :before)"
+        )
+        params["before"] = before
+
+    def query(extra_condition: str) -> str:
+        return f"""
+            SELECT id, subject, answer, image_small IS NOT NULL AS has_thumbnail, created_at
+            FROM user_questions
+            WHERE {" AND ".join(conditions + [extra_condition])}
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit
+        """
+
+    # A literal month boundary lets the planner prune the partitions at plan time
+    recent_since = datetime.datetime.combine(
+        month_start(datetime.date.today(), 1 - history_recent_months), datetime.time()
+    )
 
     with Session(engine) as session:
+        result = session.execute(
+            text(query("created_at >= :recent_since")), {**params, "recent_since": recent_since}
+        ).all()
+        if len(result) < limit:
+            result += session.execute(
+                text(query("created_at < :recent_since")),
+                {**params, "recent_since": recent_since, "limit": limit - len(result)},
+            ).all()
+
+    return [
+        UserQuestionHistoryDTO(
+            id=row.id,
+            subject=row.subject,
+            answer=row.answer,
+            thumbnail_url=thumbnail_url(row.id) if row.has_thumbnail else None,
+            created_at=row.created_at,
+        ) for row in result
+    ]
+
+
+image_chunk_size = 256 * 1024
+image_columns = {"original": "image", "small": "image_small"}
+
+
+def get_question_image(question_id: str, size: str = "original"):
+    """
+    Streams a stored image with its recorded content type. The bytea value is read in
+    image_chunk_size slices, so a large original is never held in memory in one piece.
+    """
+    column = image_columns.get(size)
+    if column is None:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(image_columns)}")
 
-        query = f"""
-            SELECT * FROM questions
-            where user_id = '{user_id}'
-            and created_at between '{start}' and '{end}'
-            order by created_at desc
-            """
-        if subject == "수학":
-            query += " and subject = 'math'"
-        elif subject == "과학":
-            query += " and subject = 'science'"
-
-        result = session.execute(text(
-            query
-        )).all()
-
-        data = [
-            UserQuestion(
-                id=row.id,
-                user_id=row.user_id,
-                subject=row.subject,
-                answer=row.answer,
-                image=row.image,
-                image_small=row.image_small,
-                created_at=row.created_at,
-
-            ) for row in result
-        ]
-
-        res = [{
-            "id": d.id,
-            "subject": d.subject,
-            "answer": d.answer,
-            "image_preview": d.image_small,
-            "created_at": d.created_at.isoformat(),
-        } for d in data]
-
-    return JSONResponse(
-        content=res,
-        media_type="application/json; charset=utf-8"
+    with Session(engine) as session:
+        row = session.execute(text(f"""
+            SELECT octet_length({column}) AS length, {column}_content_type AS content_type
+            FROM user_questions
+            WHERE id = :id
+        """), {"id": question_id}).first()
+
+        if row is not None and row.length is None and column == "image":
+            # The original was retired by retire_old_images: serve the thumbnail instead
+            column = "image_small"
+            row = session.execute(text("""
+                SELECT octet_length(image_small) AS length, image_small_content_type AS content_type
+                FROM user_questions
+                WHERE id = :id
+            """), {"id": question_id}).first()
+
+    if row is None or row.length is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    def iter_chunks():
+        with Session(engine) as session:
+            for offset in range(1, row.length + 1, image_chunk_size):
+                yield session.execute(text(f"""
+                    SELECT substring({column} from :offset for :length)
+                    FROM user_questions
+                    WHERE id = :id
+                """), {"id": question_id, "offset": offset, "length": image_chunk_size}).scalar()
+
+    return StreamingResponse(
+        iter_chunks(),
+        media_type=row.content_type or "application/octet-stream",
+        headers={"Content-Length": str(row.length)},
     )
 
+
+thumbnail_cache_control = "public, max-age=31536000, immutable"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def get_question_thumbnail(question_id: str, if_none_match: Optional[str] = None):
+    """
+    Thumbnails never change once written, so they are served with a strong ETag
+    (md5 of the stored bytes) and a one-year immutable Cache-Control. The md5 is stored
+    with the row, so a revalidation with a matching If-None-Match is answered 304 without
+    reading the image; rows written before the column existed hash image_small in Postgres.
+    """
+    with Session(engine) as session:
+        row = session.execute(text("""
+            SELECT coalesce(image_small_md5, md5(image_small)) AS digest, image_small_content_type AS content_type
+            FROM user_questions
+            WHERE id = :id
+        """), {"id": question_id}).first()
+
+        if row is None or row.digest is None:
+            raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+        etag = f'"{row.digest}"'
+        headers = {"ETag": etag, "Cache-Control": thumbnail_cache_control}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        data = session.execute(
+            text("SELECT image_small FROM user_questions WHERE id = :id"), {"id": question_id}
+        ).scalar()
+
+    return Response(content=data, media_type=row.content_type or "image/jpeg", headers=headers)
+
+
+async def answer_batch(
+        req: Request,
+        files: List[UploadFile],
+        subject: str = 'math',
+        user_id: str = "unknown",
+        use_cache: bool = True,
+):
+    """
+    Several photos of one page in one request. All of them are preprocessed in parallel,
+    at most BATCH_MAX_CONCURRENCY model calls run at once, and each answer is sent as an
+    "answer" server-sent event as soon as it is ready, in completion order. Each answered row
+    goes to the write-behind writer as soon as it is ready, so answers already paid for are
+    kept when the client goes away; the writer still inserts them in multi-row batches.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+
+    uploads = [(file.filename, await file.read()) for file in files]
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def solve(index: int, contents: bytes):
+        try:
+            prepared = await process_upload(contents)
+        except Exception as e:
+            print(e)
+            return index, UploadAnswer("unclear", unclear_image_message)
+        async with semaphore:
+            try:
+                result = await solve_upload(contents, subject, user_id, use_cache, prepared)
+            except ModelBusyError:
+                return index, UploadAnswer("busy", busy_message)
+        if result.user_question is not None:
+            await answer_writer.submit([result.user_question])
+        return index, result
+
+    async def event_stream():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(solve(index, contents)) for index, (_, contents) in enumerate(uploads)]
+        answered = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                if result.user_question is not None:
+                    answered += 1
+                yield sse_event("answer", {
+                    "index": index,
+                    "filename": uploads[index][0],
+                    "status": result.status,
+                    "text": result.text,
+                    "id": result.user_question.id if result.user_question is not None else None,
+                })
+        finally:
+            for task in tasks:
+                task.cancel()  # client went away: stop the remaining model calls
+
+        metrics.observe("batch_ms", (time.perf_counter() - started) * 1000, files=str(len(uploads)))
+        yield sse_event("done", {"count": len(uploads), "answered": answered})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+numbered_line_pattern = re.compile(r"^\s*(?:\*\*)?(\d+)\s*[.)]")
+
+
+def answer_excerpt(answer: str, line_number: Optional[int]) -> str:
+    """
+    The stored explanation, or for long ones only the lines around the asked line
+    (found by its "n." / "n)" numbering, else as the n-th non-empty line) plus the topic sentence.
+    """
+    if line_number is None or count_tokens(answer) <= FOLLOWUP_FULL_ANSWER_TOKENS:
+        return answer
+
+    lines = answer.splitlines()
+    index = next(
+        (i for i, line in enumerate(lines)
+         if (match := numbered_line_pattern.match(line)) and int(match.group(1)) == line_number),
+        None,
+    )
+    if index is None:
+        non_empty = [i for i, line in enumerate(lines) if line.strip()]
+        if not non_empty:
+            return answer
+        index = non_empty[min(line_number, len(non_empty)) - 1]
+
+    start = max(0, index - FOLLOWUP_CONTEXT_LINES)
+    end = index + FOLLOWUP_CONTEXT_LINES + 1
+    excerpt = lines[start:end]
+    if start > 0:
+        excerpt = [lines[0], "(...)"] + excerpt
+    if end < len(lines):
+        excerpt.append("(...)")
+    return "\n".join(excerpt)
+
+
+def build_followup_messages(question_id: str, followup: FollowupRequest):
+    columns = "user_id, subject, answer" + (", image_small, image_small_content_type" if followup.include_image else "")
+    # An answer from a moment ago may still be waiting in the write-behind queue
+    row = answer_writer.pending(question_id)
+    if row is None:
+        with Session(engine) as session:
+            row = session.execute(
+                text(f"SELECT {columns} FROM user_questions WHERE id = :id"), {"id": question_id}
+            ).first()
+    if row is None or not row.answer:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    thumbnail_data_url = None
+    if followup.include_image and row.image_small:
+        encoded = base64.b64encode(row.image_small).decode('utf-8')
+        thumbnail_data_url = f"data:{row.image_small_content_type or 'image/jpeg'};base64,{encoded}"
+
+    excerpt = answer_excerpt(row.answer, followup.line_number)
+    messages = [
+        init_followup_config(row.subject),
+        get_followup_question(excerpt, followup.question, followup.line_number, thumbnail_data_url),
+    ]
+    prompt_tokens = count_tokens(messages[0]["content"]) + count_tokens(followup.question) \
+        + count_tokens(excerpt) + (85 if thumbnail_data_url else 0)
+    return row.user_id, row.subject, messages, prompt_tokens + FOLLOWUP_MAX_TOKENS
+
+
+async def answer_followup(question_id: str, followup: FollowupRequest):
+    """
+    Follow-up about a stored answer: a short text-only prompt built from the saved explanation
+    (optionally with the low-detail thumbnail) on FOLLOWUP_MODEL, instead of a new vision call.
+    """
+    # The stored answer is read and the prompt tokens counted on a worker thread
+    user_id, subject, messages, tokens = await asyncio.to_thread(build_followup_messages, question_id, followup)
+    thumbnail_tokens = 85 if followup.include_image else 0
+
+    def create(stream: bool = False):
+        return get_openai_client().chat.completions.create(
+            messages=messages,
+            model=FOLLOWUP_MODEL,
+            max_tokens=FOLLOWUP_MAX_TOKENS,
+            stream=stream,
+            **({"stream_options": {"include_usage": True}} if stream else {}),
+        )
+
+    if not followup.stream:
+        with track(user_id, subject, "followup", FOLLOWUP_MODEL, thumbnail_tokens) as record:
+            try:
+                response = await model_scheduler.call(user_id, tokens, create, record)
+                return {"response": response.choices[0].message.content}
+            except ModelBusyError:
+                raise
+            except Exception as e:
+                print(e)
+                record.outcome = "error"
+                raise HTTPException(status_code=502, detail=server_error_message)
+
+    async def event_stream():
+        record = track(user_id, subject, "followup", FOLLOWUP_MODEL, thumbnail_tokens)
+        record.outcome = "cancelled"
+        try:
+            await model_scheduler.acquire(user_id, tokens)
+        except ModelBusyError as e:
+            record.finish("busy")
+            yield sse_event("busy", {"text": busy_message, "retryAfter": e.retry_after})
+            return
+        record.started()
+
+        generated = 0
+        try:
+            stream = await open_stream(lambda: create(stream=True))
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record.add_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    record.first_token()
+                    generated += len(chunk.choices[0].delta.content)
+                    yield sse_event("token", {"text": chunk.choices[0].delta.content})
+            record.outcome = "answered"
+            yield sse_event("done", {"id": question_id})
+        except ModelBusyError as e:
+            record.outcome = "timeout" if isinstance(e, ModelDeadlineError) else "busy"
+            yield sse_event("busy", {"text": busy_message, "retryAfter": e.retry_after})
+        except Exception as e:
+            print(e)
+            record.outcome = "error"
+            yield sse_event("error", {"text": server_error_message})
+        finally:
+            model_scheduler.release(max(0, FOLLOWUP_MAX_TOKENS - generated))
+            record.finish()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,111 @@
+import math
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from service import metrics
+from service.questions.config import TRIAGE_ENABLED, TRIAGE_MODEL, TRIAGE_THRESHOLD, SOLVER_MODEL, \
+    SOLVER_MAX_TOKENS, MODEL_ROUTING
+from service.questions.model_scheduler import model_scheduler, ModelBusyError
+from service.questions.model_telemetry import track
+from service.questions.openai_client import get_openai_client
+
+
+@dataclass(slots=True, frozen=True)
+class ModelRoute:
+    triage_enabled: bool = TRIAGE_ENABLED
+    triage_model: str = TRIAGE_MODEL
+    threshold: float = TRIAGE_THRESHOLD
+    solver_model: str = SOLVER_MODEL
+    solver_max_tokens: int = SOLVER_MAX_TOKENS
+
+
+_default_route = ModelRoute()
+_routes = {subject: replace(_default_route, **overrides) for subject, overrides in MODEL_ROUTING.items()}
+
+
+def get_route(subject: str) -> ModelRoute:
+    return _routes.get(subject, _default_route)
+
+
+@dataclass(slots=True)
+class TriageResult:
+    outcome: str  # clear, unclear, error (failed open) or skipped
+    probability: Optional[float] = None
+
+    @property
+    def clear(self) -> bool:
+        return self.outcome != "unclear"
+
+
+def triage_messages(subject: str, thumbnail_data_url: str):
+    return [
+        {
+            "role": "system",
+            "content": f"You check photos uploaded by Korean high school students before a tutor solves them. "
+                       f"Reply with exactly one character: 1 if the photo shows a {subject} problem whose text and "
+                       f"figures are legible enough to solve, 0 otherwise."
+        },
+        {
+            "role": "user",
+            "content": [{"type": "image_url", "image_url": {"url": thumbnail_data_url, "detail": "low"}}],
+        },
+    ]
+
+
+def probability_of_one(choice) -> Optional[float]:
+    logprobs = getattr(choice, "logprobs", None)
+    if logprobs is None or not logprobs.content:
+        return None
+    return sum(
+        math.exp(candidate.logprob)
+        for candidate in logprobs.content[0].top_logprobs
+        if candidate.token.strip() == "1"
+    )
+
+
+async def triage_image(user_id: str, subject: str, thumbnail_data_url: str,
+                       route: Optional[ModelRoute] = None) -> TriageResult:
+    """
+    One-token legibility check on the small model with the low-detail thumbnail
+    (85 image tokens). The probability of "1" from the top logprobs is compared with the
+    route's threshold; if logprobs are missing, the sampled token decides.
+    Failures other than ModelBusyError let the photo through to the solver.
+    """
+    route = route or get_route(subject)
+    if not route.triage_enabled:
+        return TriageResult("skipped")
+
+    with track(user_id, subject, "triage", route.triage_model, image_tokens=85) as record:
+        try:
+            response = await model_scheduler.call(
+                user_id,
+                85 + 100 + 1,
+                lambda: get_openai_client().chat.completions.create(
+                    messages=triage_messages(subject, thumbnail_data_url),
+                    model=route.triage_model,
+                    max_tokens=1,
+                    temperature=0,
+                    logprobs=True,
+                    top_logprobs=5,
+                ),
+                record,
+            )
+        except ModelBusyError:
+            raise
+        except Exception as e:
+            print(f"triage failed, escalating: {e}")
+            record.outcome = "error"
+            metrics.increment("triage_outcomes", outcome="error", subject=subject)
+            return TriageResult("error")
+
+        choice = response.choices[0]
+        probability = probability_of_one(choice)
+        if probability is None:
+            probability = 1.0 if (choice.message.content or "").strip().startswith("1") else 0.0
+
+        outcome = "clear" if probability >= route.threshold else "unclear"
+        record.outcome = outcome
+
+    metrics.increment("triage_outcomes", outcome=outcome, subject=subject)
+    metrics.observe("triage_probability", probability, subject=subject)
+    return TriageResult(outcome, probability)
@@ -0,0 +1,73 @@
+import datetime
+import os
+from urllib.parse import quote
+
+from sqlalchemy import text
+
+from database.database import engine
+from database.models.user_question import month_start, create_month_partitions
+from service import metrics
+from service.questions.config import USER_QUESTION_PARTITIONS_AHEAD, IMAGE_RETENTION_DAYS, IMAGE_ARCHIVE_DIR, \
+    IMAGE_RETENTION_BATCH_SIZE
+
+_extensions = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+
+
+def ensure_partitions(months_ahead: int = USER_QUESTION_PARTITIONS_AHEAD):
+    """
+    Keeps the current month and the next months_ahead months of user_questions partitions
+    in place, so an insert never lands on a month without a partition.
+    """
+    with engine.begin() as connection:
+        created = create_month_partitions(connection, month_start(datetime.date.today()), months_ahead + 1)
+    if created:
+        print(f"Created user_questions partitions: {', '.join(created)}")
+
+
+def archive_image(question_id: str, created_at: datetime.datetime, data: bytes, content_type: str):
+    directory = os.path.join(IMAGE_ARCHIVE_DIR, created_at.strftime("%Y-%m"))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{quote(question_id, safe='')}.{_extensions.get(content_type, 'bin')}")
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def retire_old_images(retention_days: int = IMAGE_RETENTION_DAYS, batch_size: int = IMAGE_RETENTION_BATCH_SIZE):
+    """
+    Clears the full-resolution image of questions older than retention_days, keeping the
+    answer and the thumbnail. With IMAGE_ARCHIVE_DIR set, each image is written there first
+    (<dir>/<YYYY-MM>/<id>.<ext>). The created_at bound keeps every batch on the old partitions,
+    and each batch is committed on its own.
+    """
+    if retention_days <= 0:
+        return
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    mode = "archive" if IMAGE_ARCHIVE_DIR else "drop"
+    columns = "id, created_at, image, image_content_type" if IMAGE_ARCHIVE_DIR else "id, created_at"
+
+    retired = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(f"""
+                SELECT {columns} FROM user_questions
+                WHERE created_at < :cutoff AND image IS NOT NULL
+                ORDER BY created_at
+                LIMIT :batch_size
+            """), {"cutoff": cutoff, "batch_size": batch_size}).all()
+            if not rows:
+                break
+
+            if IMAGE_ARCHIVE_DIR:
+                for row in rows:
+                    archive_image(row.id, row.created_at, row.image, row.image_content_type)
+
+            connection.execute(text("""
+                UPDATE user_questions SET image = NULL
+                WHERE id = ANY(:ids) AND created_at >= :oldest AND created_at < :cutoff
+            """), {"ids": [row.id for row in rows], "oldest": rows[0].created_at, "cutoff": cutoff})
+
+        retired += len(rows)
+        metrics.increment("user_question_images_retired", len(rows), mode=mode)
+
+    if retired:
+        print(f"Retired {retired} full-resolution images older than {cutoff:%Y-%m-%d} ({mode})")
@@ -36,7 +36,7 @@ def init_system_config(subject) -> dict:
 """
 
 
-def get_question_with_image(base64_image, subject='math'):
+def get_question_with_image(base64_image, subject='math', mime_type='image/png'):
     return {
         "role": "user",
         "content": [
@@ -47,8 +47,33 @@ def get_question_with_image(base64_image, subject='math'):
             {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/png;base64,{base64_image}"
+                    "url": f"data:{mime_type};base64,{base64_image}"
                 }
             }
         ]
     }
+
+
+def init_followup_config(subject) -> dict:
+    return {
+        "role": "system",
+        "content": f"You tutor a Korean high school student in {subject}. "
+                   f"You previously wrote the numbered explanation below for a problem the student photographed. "
+                   f"Answer the student's follow-up question about it in Korean, briefly and step by step, "
+                   f"referring to line numbers where useful. Do not repeat the whole explanation."
+    }
+
+
+def get_followup_question(answer_excerpt, question, line_number=None, thumbnail_url=None):
+    focus = f"The student is asking about line {line_number}.\n" if line_number else ""
+    text = f"Your explanation:\n{answer_excerpt}\n\n{focus}Student's question: {question}"
+    if thumbnail_url is None:
+        return {"role": "user", "content": text}
+    return {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": text},
+            # Low detail is a flat 85 image tokens, enough to look at the figure again
+            {"type": "image_url", "image_url": {"url": thumbnail_url, "detail": "low"}},
+        ]
+    }
@@ -0,0 +1,37 @@
+import base64
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any):
+    # orjson natively handles dataclasses (including the slot-based read models), datetimes,
+    # UUIDs and numpy arrays. Everything else it cannot encode ends up here.
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(obj)).decode('ascii')
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Default response class of the app. Serializes with orjson straight to UTF-8 bytes,
+    so Korean text is not \\u-escaped and no intermediate jsonable_encoder pass is needed.
+    """
+    media_type = "application/json; charset=utf-8"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
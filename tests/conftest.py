@@ -0,0 +1,63 @@
+import json
+from typing import Dict, List
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from database.models import crud
+from loadtest import fake_openai_server
+from service.questions import openai_client
+from service.questions.model_telemetry import model_call_recorder
+
+
+class FakeOpenAITransport(httpx.AsyncBaseTransport):
+    """
+    Serves loadtest/fake_openai_server in-process and keeps the body of every request.
+    Models listed in fail_models are answered with that status instead.
+    """
+
+    def __init__(self):
+        self.app_transport = httpx.ASGITransport(app=fake_openai_server.app)
+        self.requests: List[dict] = []
+        self.fail_models: Dict[str, int] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(await request.aread())
+        self.requests.append(body)
+        status = self.fail_models.get(body.get("model"))
+        if status is not None:
+            return httpx.Response(status, json={"error": {"message": "failed (test)", "type": "test_error"}})
+        return await self.app_transport.handle_async_request(request)
+
+    @property
+    def models(self) -> List[str]:
+        return [body["model"] for body in self.requests]
+
+
+@pytest.fixture
+def fake_openai(monkeypatch) -> FakeOpenAITransport:
+    # No latency and instant tokens; tests change the FAKE_* knobs on fake_openai_server
+    monkeypatch.setattr(fake_openai_server, "LATENCY", "fixed")
+    monkeypatch.setattr(fake_openai_server, "LATENCY_MS", 0)
+    monkeypatch.setattr(fake_openai_server, "TAIL_RATE", 0)
+    monkeypatch.setattr(fake_openai_server, "ERROR_RATE", 0)
+    monkeypatch.setattr(fake_openai_server, "RATE_LIMIT_RATE", 0)
+    monkeypatch.setattr(fake_openai_server, "UNCLEAR_RATE", 0)
+    monkeypatch.setattr(fake_openai_server, "TOKENS_PER_SEC", 100_000)
+    monkeypatch.setattr(fake_openai_server, "ANSWER_TOKENS", 20)
+
+    transport = FakeOpenAITransport()
+    client = AsyncOpenAI(api_key="test", base_url="http://fake-openai/v1", max_retries=0,
+                         http_client=httpx.AsyncClient(transport=transport))
+    monkeypatch.setattr(openai_client, "_client", client)
+    monkeypatch.setattr(model_call_recorder, "enabled", False)
+    return transport
+
+
+@pytest.fixture
+def written_rows(monkeypatch) -> list:
+    # answer_writer is not started in tests, so submit() writes inline through crud.insert_many
+    rows = []
+    monkeypatch.setattr(crud, "insert_many", rows.extend)
+    return rows
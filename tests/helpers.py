@@ -0,0 +1,34 @@
+from io import BytesIO
+from pathlib import Path
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from loadtest import fake_openai_server
+
+font_path = Path(__file__).resolve().parents[1] / "default_font.ttf"
+
+
+def problem_photo(lines: int = 12, background: int = 205, size=(1200, 1600)) -> bytes:
+    """
+    A JPEG of a page with `lines` lines of dark text, like a photographed worksheet
+    (background 205) or a clean screenshot (background 255).
+    """
+    image = Image.new("L", size, background)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(str(font_path), 44)
+    for i in range(lines):
+        draw.text((60, 80 + i * 60), f"{i + 1}. x^2 + {i + 2}x + {i + 1} = 0 의 두 근의 합을 구하시오.", fill=20, font=font)
+    output = BytesIO()
+    image.convert("RGB").save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def expected_answer(tokens: int = 20) -> str:
+    # The fake server's answer after the "1. " clarity prefix
+    words = fake_openai_server.answer_words
+    return "".join(words[i % len(words)] + " " for i in range(tokens - 1))
+
+
+async def collect(events) -> List[Tuple[str, dict]]:
+    return [event async for event in events]
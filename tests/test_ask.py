@@ -0,0 +1,33 @@
+import asyncio
+import json
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from service.questions.questions_service import solve_upload, answer_batch
+from tests.helpers import problem_photo
+
+
+def test_unreadable_upload_is_rejected_with_400(fake_openai):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(solve_upload(b"not an image", "math", "student-1", use_cache=False))
+
+    assert error.value.status_code == 400
+    assert fake_openai.requests == []
+
+
+def test_batch_keeps_answers_when_client_disconnects(fake_openai, written_rows):
+    files = [UploadFile(file=BytesIO(problem_photo(lines=8 + i)), filename=f"page{i}.jpg") for i in range(3)]
+
+    async def read_first_answer_and_disconnect():
+        response = await answer_batch(None, files, "math", "student-1", use_cache=False)
+        events = response.body_iterator
+        first = await events.__anext__()
+        await events.aclose()
+        return first
+
+    first = asyncio.run(read_first_answer_and_disconnect())
+
+    answered_id = json.loads(first.split(b"data: ", 1)[1])["id"]
+    assert answered_id in [row.id for row in written_rows]
@@ -0,0 +1,60 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from loadtest import fake_openai_server
+from service.questions import questions_service
+from service.questions.questions_service import answer_upload_events, unclear_image_message, \
+    unreadable_image_detail
+from service.questions.triage import get_route
+from tests.helpers import problem_photo, expected_answer, collect
+
+
+@pytest.fixture
+def without_triage(monkeypatch):
+    # Straight to the solver, so the stream's own clarity check is what decides
+    monkeypatch.setattr(questions_service, "get_route", lambda subject: replace(get_route(subject), triage_enabled=False))
+
+
+def test_stream_strips_clarity_prefix(fake_openai, written_rows, without_triage):
+    events = asyncio.run(collect(answer_upload_events(problem_photo(), "math", "student-1", use_cache=False)))
+
+    names = [event for event, _ in events]
+    assert names[-1] == "done"
+    assert set(names[:-1]) == {"token"}
+    assert "".join(data["text"] for event, data in events if event == "token") == expected_answer()
+    assert fake_openai.requests[-1]["stream"] is True
+
+
+def test_stream_unclear_prefix_short_circuits(fake_openai, written_rows, without_triage, monkeypatch):
+    monkeypatch.setattr(fake_openai_server, "UNCLEAR_RATE", 1)
+
+    events = asyncio.run(collect(answer_upload_events(problem_photo(), "math", "student-1", use_cache=False)))
+
+    assert events == [("unclear", {"text": unclear_image_message})]
+    assert fake_openai.models == [get_route("math").solver_model]
+    assert written_rows == []
+
+
+def test_streamed_answer_is_persisted(fake_openai, written_rows, without_triage):
+    contents = problem_photo()
+
+    events = asyncio.run(collect(answer_upload_events(contents, "math", "student-1", use_cache=False)))
+
+    done = dict(events)["done"]
+    assert len(written_rows) == 1
+    row = written_rows[0]
+    assert row.id == done["id"]
+    assert row.user_id == "student-1"
+    assert row.subject == "math"
+    assert row.answer == expected_answer()
+    assert row.image == contents
+    assert row.image_small is not None and row.image_small_content_type == "image/jpeg"
+
+
+def test_stream_reports_unreadable_upload_as_error(fake_openai, written_rows):
+    events = asyncio.run(collect(answer_upload_events(b"not an image", "math", "student-1", use_cache=False)))
+
+    assert events == [("error", {"text": unreadable_image_detail})]
+    assert fake_openai.requests == []
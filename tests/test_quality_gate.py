@@ -0,0 +1,47 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageEnhance, ImageFilter
+
+from service.questions.quality_gate import assess_quality, rejection_reason
+from tests.helpers import problem_photo
+
+
+def edited(contents: bytes, edit) -> bytes:
+    output = BytesIO()
+    edit(Image.open(BytesIO(contents))).save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("lines", [3, 8, 15, 30])
+def test_clean_screenshot_passes(lines):
+    # White background: most pixels are clipped to white, the text is still perfectly legible
+    report = assess_quality(problem_photo(lines=lines, background=255))
+
+    assert rejection_reason("math", report) is None
+
+
+def test_photographed_page_passes():
+    assert rejection_reason("math", assess_quality(problem_photo())) is None
+
+
+def test_blurry_photo_is_rejected():
+    report = assess_quality(edited(problem_photo(), lambda image: image.filter(ImageFilter.GaussianBlur(10))))
+
+    assert rejection_reason("math", report) == "blurry"
+
+
+def test_washed_out_photo_is_rejected_as_overexposed():
+    # Faint text on a blown-out page
+    report = assess_quality(edited(
+        problem_photo(lines=12, background=255),
+        lambda image: ImageEnhance.Contrast(image).enhance(0.04).point(lambda value: min(255, value + 8)),
+    ))
+
+    assert rejection_reason("math", report) == "overexposed"
+
+
+def test_dark_photo_is_rejected():
+    report = assess_quality(edited(problem_photo(), lambda image: ImageEnhance.Brightness(image).enhance(0.08)))
+
+    assert rejection_reason("math", report) == "dark"
@@ -0,0 +1,51 @@
+import asyncio
+from dataclasses import replace
+
+from loadtest import fake_openai_server
+from service.questions import triage
+from service.questions.questions_service import solve_upload, unclear_image_message
+from service.questions.triage import get_route
+from tests.helpers import problem_photo, expected_answer
+
+
+def test_clear_photo_is_escalated_to_the_solver(fake_openai, written_rows):
+    route = get_route("math")
+
+    result = asyncio.run(solve_upload(problem_photo(), "math", "student-1", use_cache=False))
+
+    assert result.status == "answered"
+    assert result.text == expected_answer()
+    assert fake_openai.models == [route.triage_model, route.solver_model]
+    assert fake_openai.requests[0]["logprobs"] is True and fake_openai.requests[0]["max_tokens"] == 1
+
+
+def test_unclear_photo_stops_at_triage(fake_openai, written_rows, monkeypatch):
+    monkeypatch.setattr(fake_openai_server, "UNCLEAR_RATE", 1)
+
+    result = asyncio.run(solve_upload(problem_photo(), "math", "student-1", use_cache=False))
+
+    assert result.status == "unclear"
+    assert result.text == unclear_image_message
+    assert result.user_question is None
+    assert fake_openai.models == [get_route("math").triage_model]
+
+
+def test_failed_triage_falls_back_to_the_solver(fake_openai, written_rows):
+    route = get_route("math")
+    fake_openai.fail_models[route.triage_model] = 400
+
+    result = asyncio.run(solve_upload(problem_photo(), "math", "student-1", use_cache=False))
+
+    assert result.status == "answered"
+    assert fake_openai.models == [route.triage_model, route.solver_model]
+
+
+def test_subject_route_overrides_models(fake_openai, written_rows, monkeypatch):
+    route = replace(get_route("english"), triage_enabled=False, solver_model="gpt-4o-2024-08-06", solver_max_tokens=800)
+    monkeypatch.setitem(triage._routes, "english", route)
+
+    result = asyncio.run(solve_upload(problem_photo(), "english", "student-1", use_cache=False))
+
+    assert result.status == "answered"
+    assert fake_openai.models == ["gpt-4o-2024-08-06"]
+    assert fake_openai.requests[0]["max_tokens"] == 800